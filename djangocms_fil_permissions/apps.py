@@ -1,9 +1,15 @@
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import gettext_lazy as _
 
 
 class PermissionsConfig(AppConfig):
     name = "djangocms_fil_permissions"
     verbose_name = _("django CMS FIL Permissions")
+
+    def ready(self):
+        from . import handlers  # noqa: F401
+        from .instrumentation import load_collectors
+
+        load_collectors()
@@ -0,0 +1,128 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import instrumentation
+
+
+KEY_PREFIX = "djangocms_fil_permissions"
+GENERATION_KEY = "%s:generation" % KEY_PREFIX
+
+
+class CacheStats(object):
+    """Counts hits and misses of the shared site IDs cache."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    """Returns cache backend configured with
+    ``DJANGOCMS_FIL_PERMISSIONS_CACHE`` setting or None if shared
+    caching is disabled (default).
+    """
+    alias = getattr(settings, "DJANGOCMS_FIL_PERMISSIONS_CACHE", None)
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def get_timeout():
+    return getattr(settings, "DJANGOCMS_FIL_PERMISSIONS_CACHE_TIMEOUT", 300)
+
+
+def _entry_key(user_id):
+    return "%s:user_sites:%s" % (KEY_PREFIX, user_id)
+
+
+def _version_key(user_id):
+    return "%s:user_sites_version:%s" % (KEY_PREFIX, user_id)
+
+
+def get_user_site_ids(user_id, loader):
+    """Returns site IDs of user with provided ID from the shared cache.
+
+    On cache miss (or when shared caching is disabled) ``loader``
+    is called to fetch site IDs from the database.
+
+    Entries are stored together with the version they were computed
+    for (a global generation and a per-user version), so an entry
+    written by a request that raced with an invalidation is never used.
+
+    :param user_id: User ID
+    :param loader: Callable returning a frozenset of site IDs
+    """
+    cache = get_cache()
+    if cache is None:
+        return loader()
+    keys = _keys(user_id)
+    version, site_ids = _read_entry(keys, cache.get_many(keys))
+    if site_ids is None:
+        site_ids = loader()
+        cache.set(keys[0], (version, site_ids), get_timeout())
+    return site_ids
+
+
+async def aget_user_site_ids(user_id, loader):
+    """Async counterpart of `get_user_site_ids`, sharing its entries.
+
+    :param user_id: User ID
+    :param loader: Async callable returning a frozenset of site IDs
+    """
+    cache = get_cache()
+    if cache is None:
+        return await loader()
+    keys = _keys(user_id)
+    version, site_ids = _read_entry(keys, await cache.aget_many(keys))
+    if site_ids is None:
+        site_ids = await loader()
+        await cache.aset(keys[0], (version, site_ids), get_timeout())
+    return site_ids
+
+
+def _keys(user_id):
+    return [_entry_key(user_id), _version_key(user_id), GENERATION_KEY]
+
+
+def _read_entry(keys, values):
+    """Returns a tuple of (version, site_ids) read from cached `values`.
+    site_ids is None if the entry is missing or stale.
+    """
+    entry_key, version_key, generation_key = keys
+    version = (values.get(generation_key), values.get(version_key))
+    entry = values.get(entry_key)
+    if entry is not None and entry[0] == version:
+        stats.hits += 1
+        instrumentation.increment("cache_hit")
+        return version, entry[1]
+    stats.misses += 1
+    instrumentation.increment("cache_miss")
+    return version, None
+
+
+def invalidate_user(user_id):
+    """Invalidates cached site IDs of user with provided ID.
+
+    :param user_id: User ID
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+    cache.delete(_entry_key(user_id))
+    cache.set(_version_key(user_id), uuid4().hex, None)
+
+
+def invalidate_all():
+    """Invalidates cached site IDs of all users."""
+    cache = get_cache()
+    if cache is None:
+        return
+    cache.set(GENERATION_KEY, uuid4().hex, None)
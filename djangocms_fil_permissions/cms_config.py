@@ -1,16 +1,44 @@
 from collections.abc import Mapping
+from functools import wraps
 from operator import attrgetter
 
+from django.contrib.admin.sites import AdminSite, all_sites
 from django.core.exceptions import ImproperlyConfigured
 
 from cms.app_base import CMSAppExtension
 
-from .helpers import replace_admin_for_model
+from .handlers import connect_denormalized_site
+from .helpers import get_extension, replace_admin_for_model
+
+
+def hook_admin_sites():
+    """Wraps ``AdminSite.get_urls`` (once) so every AdminSite instance,
+    including ones created after configuration, patches modeladmins
+    of registered models in its own registry right before building
+    its URLs, i.e. before any modeladmin views get bound to them.
+    Management commands and processes not serving the admin don't pay
+    for patching.
+    """
+    get_urls = AdminSite.get_urls
+    if getattr(get_urls, "patches_site_permissions", False):
+        return
+
+    @wraps(get_urls)
+    def patched_get_urls(admin_site):
+        get_extension().patch_admin_site(admin_site)
+        return get_urls(admin_site)
+
+    patched_get_urls.patches_site_permissions = True
+    AdminSite.get_urls = patched_get_urls
 
 
 class PermissionsCMSExtension(CMSAppExtension):
     def __init__(self):
         self.site_permission_models = {}
+        self.site_permission_lookups = {}
+        self.site_id_getters = {}
+        self.denormalized_site_relations = {}
+        self._registered_models = {}
 
     def translate_relation(self, relation):
         """Transforms Django-style related field lookup (foo__bar)
@@ -22,6 +50,19 @@ class PermissionsCMSExtension(CMSAppExtension):
         fields = relation.split("__")
         return attrgetter(".".join(fields))
 
+    def translate_relation_to_id(self, relation):
+        """Transforms Django-style related field lookup (foo__site)
+        into attrgetter instance that can be called with an object
+        to receive the value of the foreign key at the end of
+        defined relation chain (foo.site_id), without fetching
+        the related object itself.
+
+        :param relation: Django-style field lookup
+        """
+        fields = relation.split("__")
+        fields[-1] = "%s_id" % fields[-1]
+        return attrgetter(".".join(fields))
+
     def register_model(self, model, site_relation):
         """Registers model for per-site permission system.
 
@@ -30,6 +71,79 @@ class PermissionsCMSExtension(CMSAppExtension):
                               a Site from the provided model
         """
         self.site_permission_models[model] = self.translate_relation(site_relation)
+        self.site_permission_lookups[model] = site_relation
+        self.site_id_getters[model] = self.translate_relation_to_id(site_relation)
+        self._registered_models.clear()
+
+    def register_denormalized_field(self, model, field_name):
+        """Makes permission checks and queryset filters of registered
+        `model` use `field_name`, a FK to Site on the model itself,
+        instead of walking its site relation.
+
+        The field is kept in sync with the registered relation
+        when objects on its path are saved. Objects with the field
+        not set yet (e.g. created with ``bulk_create`` before
+        ``backfill_site_ids`` is run) are checked by walking
+        the relation instead.
+
+        :param model: Model class registered for per-site permissions
+        :param field_name: Name of a FK to Site on `model`
+        """
+        relation = self.denormalized_site_relations.get(
+            model, self.site_permission_lookups.get(model)
+        )
+        if relation is None:
+            raise ImproperlyConfigured(
+                "%s must be registered for per-site permissions "
+                "before its site can be denormalized" % model.__name__
+            )
+        connect_denormalized_site(model, field_name, relation)
+        self.register_model(model, field_name)
+        self.site_permission_models[model] = self.fall_back(
+            self.site_permission_models[model], self.translate_relation(relation)
+        )
+        self.site_id_getters[model] = self.fall_back(
+            self.site_id_getters[model], self.translate_relation_to_id(relation)
+        )
+        self.denormalized_site_relations[model] = relation
+
+    def fall_back(self, getter, fallback):
+        """Returns a callable returning the result of `getter`
+        called with an object, or of `fallback` if that's None.
+
+        :param getter: Callable taking an object
+        :param fallback: Callable taking an object
+        """
+
+        def get(obj):
+            value = getter(obj)
+            if value is None:
+                return fallback(obj)
+            return value
+
+        return get
+
+    def get_registered_model(self, model):
+        """Returns the model registered for per-site permissions
+        that `model` is or derives from (e.g. a proxy model
+        or a subclass of a registered model), or None if there's none.
+
+        Results are memoized, so subsequent lookups for the same class
+        don't walk its MRO again.
+
+        :param model: Model class
+        """
+        try:
+            return self._registered_models[model]
+        except KeyError:
+            pass
+        registered_model = None
+        for klass in model.__mro__:
+            if klass in self.site_permission_models:
+                registered_model = klass
+                break
+        self._registered_models[model] = registered_model
+        return registered_model
 
     def patch_admin(self, model):
         """Patches the modeladmin for provided `model` to include
@@ -39,10 +153,32 @@ class PermissionsCMSExtension(CMSAppExtension):
         """
         replace_admin_for_model(model)
 
+    def patch_admin_site(self, admin_site):
+        """Patches modeladmins of all registered models (including
+        their proxy models and subclasses) in a single pass
+        over the registry of `admin_site`.
+
+        :param admin_site: AdminSite instance
+        """
+        for model in list(admin_site._registry):
+            if self.get_registered_model(model) is not None:
+                replace_admin_for_model(model, admin_site)
+
+    def patch_admin_sites(self):
+        """Patches modeladmins of all registered models
+        on all AdminSite instances.
+        """
+        for admin_site in list(all_sites):
+            self.patch_admin_site(admin_site)
+
     def configure_models(self, definitions):
         """Registers models for per-site permission system and amends
         its admin to respect per-object permissions.
 
+        Admins of all AdminSite instances, including ones created
+        later, are patched lazily, before their URLs are built
+        (see `hook_admin_sites`).
+
         :param definitions: A mapping of {model: site_relation}.
 
         site_relation can be a related field lookup (e.g. foo__site)
@@ -54,7 +190,20 @@ class PermissionsCMSExtension(CMSAppExtension):
         """
         for model, site_relation in definitions.items():
             self.register_model(model, site_relation)
-            self.patch_admin(model)
+        hook_admin_sites()
+
+    def configure_denormalized_fields(self, definitions):
+        """Makes registered models read their site from
+        a denormalized FK to Site.
+
+        :param definitions: A mapping of {model: field_name}.
+
+        Example:
+        {Vote: "site"} makes Vote registered with "answer__poll__site"
+        use its own "site" field, kept in sync with answer.poll.site
+        """
+        for model, field_name in definitions.items():
+            self.register_denormalized_field(model, field_name)
 
     def configure_app(self, cms_config):
         site_permission_models = getattr(cms_config, "site_permission_models", None)
@@ -65,3 +214,13 @@ class PermissionsCMSExtension(CMSAppExtension):
                 raise ImproperlyConfigured(
                     "Per-site permission model configuration must be an Iterable instance"
                 )
+        denormalized_fields = getattr(
+            cms_config, "site_permission_denormalized_fields", None
+        )
+        if denormalized_fields is not None:
+            if isinstance(denormalized_fields, Mapping):
+                self.configure_denormalized_fields(denormalized_fields)
+            else:
+                raise ImproperlyConfigured(
+                    "Denormalized site field configuration must be a Mapping instance"
+                )
@@ -0,0 +1,28 @@
+from menus.base import Modifier
+from menus.menu_pool import menu_pool
+
+from .helpers import filter_nodes_by_site_access
+
+
+class SitePermissionsModifier(Modifier):
+    """Removes menu nodes related to sites the editor doesn't have
+    access to (see `filter_nodes_by_site_access`).
+
+    Only applies to staff users, so menus rendered for site visitors
+    are left intact. Menus without nodes related to sites are returned
+    before site access of the user is loaded.
+    """
+
+    def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
+        # Breadcrumbs are built from pre-cut nodes, so they're pruned too
+        if post_cut:
+            return nodes
+        user = getattr(request, "user", None)
+        if user is None or not user.is_staff:
+            return nodes
+        if not any("site_id" in node.attr for node in nodes):
+            return nodes
+        return filter_nodes_by_site_access(user, nodes)
+
+
+menu_pool.register_modifier(SitePermissionsModifier)
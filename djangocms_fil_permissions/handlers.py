@@ -0,0 +1,102 @@
+from functools import partial
+
+from django.apps import apps
+from django.contrib.sites.models import Site
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import UserSite
+
+
+# Caches are invalidated once changes are committed. Otherwise
+# a concurrent request could cache rows that are about to change
+# under the new version.
+
+
+@receiver(post_save, sender=UserSite)
+@receiver(post_delete, sender=UserSite)
+def invalidate_user_site_cache(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(cache.invalidate_user, instance.user_id), using)
+
+
+@receiver(post_delete, sender=Site)
+def invalidate_site_cache(sender, instance, using, **kwargs):
+    transaction.on_commit(cache.invalidate_all, using)
+
+
+def connect_denormalized_site(model, field_name, relation):
+    """Keeps `field_name` of `model` objects in sync with the Site
+    at the end of `relation`.
+
+    The field is set before objects of `model` are saved, and updated
+    with a single query whenever an object on the path of `relation`
+    is saved. Receivers are connected for each model on the way
+    and their subclasses (including proxies), so saves of other
+    models don't go through them.
+
+    :param model: Model class
+    :param field_name: Name of a FK to Site on `model`
+    :param relation: Related field lookup pointing to a FK to a Site
+    """
+    attname = model._meta.get_field(field_name).attname
+    names = relation.split("__")
+    receiver = _sync_site(attname, names)
+    for sender in _get_senders(model):
+        pre_save.connect(
+            receiver, sender=sender, weak=False, dispatch_uid=("fil", model)
+        )
+    related_model = model
+    for index in range(1, len(names)):
+        related_model = related_model._meta.get_field(names[index - 1]).related_model
+        receiver = _sync_related_site(
+            model, attname, "__".join(names[:index]), names[index:]
+        )
+        for sender in _get_senders(related_model):
+            post_save.connect(
+                receiver,
+                sender=sender,
+                weak=False,
+                dispatch_uid=("fil", model, related_model),
+            )
+
+
+def _get_senders(model):
+    """Returns `model` along with its installed subclasses
+    and proxy models, which send save signals as themselves.
+    """
+    return [model] + [
+        klass
+        for klass in apps.get_models()
+        if klass is not model and issubclass(klass, model)
+    ]
+
+
+def _get_site_id(obj, names):
+    """Returns the value of FK to Site at the end of relation
+    made of `names`, or None if the relation is broken on the way.
+    """
+    for name in names[:-1]:
+        obj = getattr(obj, name, None)
+    return getattr(obj, "%s_id" % names[-1], None)
+
+
+def _sync_site(attname, names):
+    def sync_site(sender, instance, raw=False, **kwargs):
+        if not raw:
+            setattr(instance, attname, _get_site_id(instance, names))
+
+    return sync_site
+
+
+def _sync_related_site(model, attname, path, names):
+    def sync_related_site(sender, instance, created=False, raw=False, **kwargs):
+        if raw or created:
+            return
+        site_id = _get_site_id(instance, names)
+        model._default_manager.filter(**{path: instance}).exclude(
+            **{attname: site_id}
+        ).update(**{attname: site_id})
+
+    return sync_related_site
@@ -1,11 +1,23 @@
-from functools import lru_cache
+from collections import OrderedDict, defaultdict
+from functools import lru_cache, partial
+from itertools import chain
 
 from django.apps import apps
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.sites.models import Site
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils.translation import ngettext
 
+from asgiref.sync import sync_to_async
 from rules.contrib.admin import ObjectPermissionsModelAdminMixin
 
+from . import cache, instrumentation
+from .instrumentation import instrument
+from .models import UserSite
+
 
 @lru_cache(maxsize=1)
 def get_extension():
@@ -13,6 +25,15 @@ def get_extension():
     return app.cms_extension
 
 
+@lru_cache(maxsize=1)
+def get_permissions_module():
+    # The permissions module depends on this one, so it's imported lazily
+    from . import permissions
+
+    return permissions
+
+
+@instrument("get_site_for_obj", obj_arg="obj")
 def get_site_for_obj(obj):
     """Returns a Site that's related to the provided object.
     Returns None if object's model is not registered for
@@ -21,26 +42,613 @@ def get_site_for_obj(obj):
     :param obj: A model object
     """
     extension = get_extension()
-    try:
-        getter = extension.site_permission_models[obj.__class__]
-    except KeyError:
+    model = extension.get_registered_model(obj.__class__)
+    if model is None:
+        return
+    return extension.site_permission_models[model](obj)
+
+
+@instrument("get_site_id_for_obj", obj_arg="obj")
+def get_site_id_for_obj(obj):
+    """Returns ID of a Site that's related to the provided object.
+    Returns None if object's model is not registered for
+    per-site permissions.
+
+    Unlike `get_site_for_obj`, the Site object itself is never fetched.
+
+    :param obj: A model object
+    """
+    extension = get_extension()
+    model = extension.get_registered_model(obj.__class__)
+    if model is None:
+        return
+    return extension.site_id_getters[model](obj)
+
+
+def get_site_id_for_pk(model, pk):
+    """Returns ID of a Site that's related to the object of `model`
+    with provided primary key, using a single query.
+    Returns None if `model` is not registered for per-site permissions
+    or the object doesn't exist.
+
+    :param model: Model class
+    :param pk: Primary key of an object
+    """
+    extension = get_extension()
+    registered_model = extension.get_registered_model(model)
+    if registered_model is None:
         return
-    return getter(obj)
+    lookup = extension.site_permission_lookups[registered_model]
+    relation = extension.denormalized_site_relations.get(registered_model)
+    if relation is not None:
+        # Rows with denormalized site not set yet fall back to the relation
+        lookup = Coalesce(lookup, relation)
+    instrumentation.increment("db_hit", model)
+    return model._default_manager.filter(pk=pk).values_list(lookup, flat=True).first()
+
+
+def _is_relation_loaded(obj, lookup):
+    """Returns True if objects on the path to the last hop of `lookup`
+    are already cached on `obj`, so they can be accessed without queries.
+    """
+    for name in lookup.split("__")[:-1]:
+        field = obj._meta.get_field(name)
+        if not field.is_cached(obj):
+            return False
+        obj = getattr(obj, name)
+        if obj is None:
+            return True
+    return True
+
+
+def get_site_ids_for_objects(objects):
+    """Returns a list of IDs of Sites related to provided objects,
+    in the same order. None is returned for objects not registered
+    for per-site permissions.
+
+    Site IDs of objects with relations that haven't been loaded
+    are fetched with a single query per model. Unsaved objects
+    and objects missing from the database walk their relation
+    instead, like `get_site_id_for_obj`.
+
+    :param objects: A list of model objects
+    """
+    site_ids, pending, unresolved = _get_loaded_site_ids(objects)
+    for (model, lookup), indexes in pending.items():
+        instrumentation.increment("db_hit", model)
+        rows = model._default_manager.filter(pk__in=indexes).values_list("pk", lookup)
+        for pk, site_id in rows:
+            for index in indexes.pop(pk, ()):
+                site_ids[index] = site_id
+        unresolved.extend(chain.from_iterable(indexes.values()))
+    _resolve_site_ids(objects, site_ids, unresolved)
+    return site_ids
+
+
+def _get_loaded_site_ids(objects):
+    """Returns a tuple of (site_ids, pending, unresolved), where site_ids
+    is a list of site IDs of `objects` with loaded relations (None
+    for others), pending maps (model, lookup) pairs to {pk: [indexes]}
+    of saved objects which site IDs need to be fetched and unresolved
+    is a list of indexes of unsaved objects.
+    """
+    extension = get_extension()
+    site_ids = [None] * len(objects)
+    pending = defaultdict(lambda: defaultdict(list))
+    unresolved = []
+    for index, obj in enumerate(objects):
+        model = extension.get_registered_model(obj.__class__)
+        if model is None:
+            continue
+        lookup = extension.site_permission_lookups[model]
+        if _is_denormalized_site_missing(extension, model, obj):
+            lookup = extension.denormalized_site_relations[model]
+        if _is_relation_loaded(obj, lookup):
+            site_ids[index] = extension.site_id_getters[model](obj)
+        elif obj.pk is None:
+            unresolved.append(index)
+        else:
+            pending[obj.__class__, lookup][obj.pk].append(index)
+    return site_ids, pending, unresolved
+
+
+def _resolve_site_ids(objects, site_ids, indexes):
+    """Sets site IDs of `objects` at `indexes` in `site_ids`
+    with `get_site_id_for_obj`.
+    """
+    for index in indexes:
+        site_ids[index] = get_site_id_for_obj(objects[index])
+
+
+def _is_denormalized_site_missing(extension, model, obj):
+    """Returns True if `model` reads site from a denormalized field
+    that isn't set on `obj`, so its registered relation has to be
+    walked instead.
+    """
+    if model not in extension.denormalized_site_relations:
+        return False
+    return getattr(obj, "%s_id" % extension.site_permission_lookups[model]) is None
+
+
+def filter_objects_by_site_access(user, objects):
+    """Returns a list of provided objects that user has access to,
+    preserving their order.
+
+    Objects of different models can be mixed. Objects of models not
+    registered for per-site permissions are always included.
+
+    If the "site_perm" rule of ``permissions.site_permissions`` has been
+    replaced, each object is checked with that rule instead.
+
+    :param user: User instance
+    :param objects: An iterable of model objects
+    """
+    objects = list(objects)
+    if user_has_global_site_access(user):
+        return objects
+    permissions = get_permissions_module()
+    if permissions.is_site_perm_replaced():
+        return [obj for obj in objects if permissions.check_site_perm(user, obj)]
+    site_ids = get_site_ids_for_objects(objects)
+    allowed_site_ids = get_user_site_ids(user)
+    return [
+        obj
+        for obj, site_id in zip(objects, site_ids)
+        if site_id is None or site_id in allowed_site_ids
+    ]
+
+
+def filter_nodes_by_site_access(user, nodes):
+    """Returns a list of menu nodes without nodes related to sites
+    user doesn't have access to, along with their descendants.
+
+    A node is related to a site by ``site_id`` key of its ``attr``.
+    Nodes without it are kept (unless their ancestor is removed).
+    ``children`` of kept nodes are updated accordingly.
+
+    :param user: User instance
+    :param nodes: A list of NavigationNode instances
+    """
+    if user_has_global_site_access(user):
+        return nodes
+    allowed_site_ids = get_user_site_ids(user)
+    denied = {}
+
+    def is_denied(node):
+        key = id(node)
+        if key not in denied:
+            site_id = node.attr.get("site_id")
+            denied[key] = (site_id is not None and site_id not in allowed_site_ids) or (
+                node.parent is not None and is_denied(node.parent)
+            )
+        return denied[key]
+
+    result = []
+    changed_parents = {}
+    for node in nodes:
+        if not is_denied(node):
+            result.append(node)
+        elif node.parent is not None and not is_denied(node.parent):
+            changed_parents[id(node.parent)] = node.parent
+    for parent in changed_parents.values():
+        parent.children = [child for child in parent.children if not is_denied(child)]
+    return result
+
+
+def _load_user_site_ids(user_id):
+    instrumentation.increment("db_hit")
+    return frozenset(
+        UserSite.objects.filter(user_id=user_id).values_list("site_id", flat=True)
+    )
+
+
+def get_user_site_ids(user):
+    """Returns a frozenset of IDs of sites the user is associated with.
+
+    The result is cached on the user object (similarly to how
+    ModelBackend caches permissions in ``_perm_cache``), so subsequent
+    calls for the same user object don't hit the database.
+    If ``DJANGOCMS_FIL_PERMISSIONS_CACHE`` is set, site IDs are also
+    shared between requests through Django's cache framework.
+
+    :param user: User instance
+    """
+    if not hasattr(user, "_site_cache"):
+        if user.pk is None:
+            site_ids = frozenset()
+        else:
+            site_ids = cache.get_user_site_ids(
+                user.pk, partial(_load_user_site_ids, user.pk)
+            )
+        user._site_cache = site_ids
+    else:
+        instrumentation.increment("memory_hit")
+    return user._site_cache
+
+
+def _has_global_site_access(user):
+    if user.is_active and user.is_superuser:
+        return True
+    perm = getattr(settings, "DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION", None)
+    return perm is not None and user.has_perm(perm)
+
+
+def user_has_global_site_access(user):
+    """Returns True if user has access to objects of all sites.
+
+    That's the case for active superusers and for users granted
+    the permission set in ``DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION``
+    (e.g. ``"myapp.access_all_sites"``).
+
+    The result is cached on the user object.
+
+    :param user: User instance
+    """
+    if not hasattr(user, "_global_site_access"):
+        user._global_site_access = _has_global_site_access(user)
+    return user._global_site_access
+
+
+@instrument("user_can_access", obj_arg="obj")
+def user_can_access(user, obj):
+    """Returns True if user has access to the site related to `obj`
+    (or `obj` is not registered for per-site permissions),
+    otherwise returns False.
+
+    Unlike ``SitePermissionBackend.has_perm``, it never raises
+    PermissionDenied, so it's cheaper to call for many objects.
+
+    If the "site_perm" rule of ``permissions.site_permissions`` has been
+    replaced, `obj` is checked with that rule instead.
+
+    :param user: User instance
+    :param obj: A model object
+    """
+    if obj is None or user_has_global_site_access(user):
+        return True
+    permissions = get_permissions_module()
+    if permissions.is_site_perm_replaced():
+        return permissions.check_site_perm(user, obj)
+    site_id = get_site_id_for_obj(obj)
+    return site_id is None or site_id in get_user_site_ids(user)
+
+
+def memoize_site_access(user, obj, check):
+    """Returns the result of ``check(user, obj)``, memoized on the user
+    object per model and primary key of `obj`, so repeated checks of
+    the same object (even if it's fetched again) are free.
+
+    The most recently used results are kept, up to
+    ``DJANGOCMS_FIL_PERMISSIONS_ACCESS_MEMO_SIZE`` (1000 by default,
+    0 disables memoization). As user objects are usually built per
+    request, so are the results.
+
+    :param user: User instance
+    :param obj: A saved model object
+    :param check: Callable returning True if user has access to `obj`
+    """
+    key = (obj.__class__, obj.pk)
+    try:
+        memo = user._site_access_memo
+    except AttributeError:
+        memo = user._site_access_memo = OrderedDict()
+    if key in memo:
+        memo.move_to_end(key)
+        instrumentation.increment("memo_hit", key[0])
+        return memo[key]
+    result = check(user, obj)
+    size = getattr(settings, "DJANGOCMS_FIL_PERMISSIONS_ACCESS_MEMO_SIZE", 1000)
+    if size and key[1] is not None:
+        memo[key] = result
+        if len(memo) > size:
+            memo.popitem(last=False)
+    return result
+
 
+def clear_site_cache(user):
+    """Removes site IDs cached on the user object by `get_user_site_ids`,
+    the result of `user_has_global_site_access` and results memoized
+    by `memoize_site_access`.
 
+    :param user: User instance
+    """
+    for attr in ("_site_cache", "_global_site_access", "_site_access_memo"):
+        try:
+            delattr(user, attr)
+        except AttributeError:
+            pass
+
+
+@instrument("user_has_access_to_site")
 def user_has_access_to_site(user, site):
     """Returns True if user is associated with provided site,
     otherwise returns False.
 
+    Both `user` and `site` can be passed as model instances or IDs.
+    Site IDs cached on a User instance are used if available.
+    When only a user ID is provided, the UserSite table is queried
+    directly (or the shared cache is used, if enabled), so no model
+    objects need to be built.
+
+    :param user: User instance or ID
+    :param site: Site instance or ID
+    """
+    site_id = getattr(site, "pk", site)
+    if hasattr(user, "pk"):
+        return site_id in get_user_site_ids(user)
+    if cache.get_cache() is not None:
+        loader = partial(_load_user_site_ids, user)
+        return site_id in cache.get_user_site_ids(user, loader)
+    instrumentation.increment("db_hit")
+    return UserSite.objects.filter(user_id=user, site_id=site_id).exists()
+
+
+async def _aload_user_site_ids(user_id):
+    instrumentation.increment("db_hit")
+    queryset = UserSite.objects.filter(user_id=user_id).values_list(
+        "site_id", flat=True
+    )
+    return frozenset([site_id async for site_id in queryset])
+
+
+async def aget_user_site_ids(user):
+    """Async counterpart of `get_user_site_ids`, sharing its caches.
+
+    :param user: User instance
+    """
+    if not hasattr(user, "_site_cache"):
+        if user.pk is None:
+            site_ids = frozenset()
+        else:
+            site_ids = await cache.aget_user_site_ids(
+                user.pk, partial(_aload_user_site_ids, user.pk)
+            )
+        user._site_cache = site_ids
+    else:
+        instrumentation.increment("memory_hit")
+    return user._site_cache
+
+
+async def auser_has_global_site_access(user):
+    """Async counterpart of `user_has_global_site_access`.
+
+    Checking the permission set in
+    ``DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION`` goes through
+    authentication backends, which are synchronous, so it's run
+    in a thread. Without that setting, no thread is used.
+
+    :param user: User instance
+    """
+    if not hasattr(user, "_global_site_access"):
+        if getattr(
+            settings, "DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION", None
+        ):
+            result = await sync_to_async(_has_global_site_access)(user)
+        else:
+            result = _has_global_site_access(user)
+        user._global_site_access = result
+    return user._global_site_access
+
+
+async def auser_has_access_to_site(user, site):
+    """Async counterpart of `user_has_access_to_site`.
+
+    :param user: User instance or ID
+    :param site: Site instance or ID
+    """
+    site_id = getattr(site, "pk", site)
+    if hasattr(user, "pk"):
+        return site_id in await aget_user_site_ids(user)
+    if cache.get_cache() is not None:
+        loader = partial(_aload_user_site_ids, user)
+        return site_id in await cache.aget_user_site_ids(user, loader)
+    instrumentation.increment("db_hit")
+    return await UserSite.objects.filter(user_id=user, site_id=site_id).aexists()
+
+
+async def aget_site_ids_for_objects(objects):
+    """Async counterpart of `get_site_ids_for_objects`.
+
+    :param objects: A list of model objects
+    """
+    site_ids, pending, unresolved = _get_loaded_site_ids(objects)
+    for (model, lookup), indexes in pending.items():
+        instrumentation.increment("db_hit", model)
+        rows = model._default_manager.filter(pk__in=indexes).values_list("pk", lookup)
+        async for pk, site_id in rows:
+            for index in indexes.pop(pk, ()):
+                site_ids[index] = site_id
+        unresolved.extend(chain.from_iterable(indexes.values()))
+    if unresolved:
+        await sync_to_async(_resolve_site_ids)(objects, site_ids, unresolved)
+    return site_ids
+
+
+async def auser_can_access(user, obj):
+    """Async counterpart of `user_can_access`.
+
+    Site relation of `obj` is fetched asynchronously if it's not loaded.
+
+    :param user: User instance
+    :param obj: A model object
+    """
+    if obj is None or await auser_has_global_site_access(user):
+        return True
+    permissions = get_permissions_module()
+    if permissions.is_site_perm_replaced():
+        return await sync_to_async(permissions.check_site_perm)(user, obj)
+    (site_id,) = await aget_site_ids_for_objects([obj])
+    return site_id is None or site_id in await aget_user_site_ids(user)
+
+
+async def afilter_objects_by_site_access(user, objects):
+    """Async counterpart of `filter_objects_by_site_access`.
+
+    :param user: User instance
+    :param objects: An iterable of model objects
+    """
+    objects = list(objects)
+    if await auser_has_global_site_access(user):
+        return objects
+    if get_permissions_module().is_site_perm_replaced():
+        return await sync_to_async(filter_objects_by_site_access)(user, objects)
+    site_ids = await aget_site_ids_for_objects(objects)
+    allowed_site_ids = await aget_user_site_ids(user)
+    return [
+        obj
+        for obj, site_id in zip(objects, site_ids)
+        if site_id is None or site_id in allowed_site_ids
+    ]
+
+
+def site_filter_for_model(model, user):
+    """Returns a Q object limiting objects of `model` to ones related
+    to sites user has access to.
+
+    Returns an empty Q object (no restriction) if `model`
+    is not registered for per-site permissions or user
+    has access to all sites.
+
+    :param model: Model class
+    :param user: User instance
+    """
+    extension = get_extension()
+    registered_model = extension.get_registered_model(model)
+    if registered_model is None or user_has_global_site_access(user):
+        return Q()
+    lookup = extension.site_permission_lookups[registered_model]
+    return Q(**{"%s__in" % lookup: get_user_site_ids(user)})
+
+
+def filter_queryset_by_site_access(queryset, user):
+    """Returns `queryset` filtered down to objects related to sites
+    user has access to.
+
+    :param queryset: QuerySet instance
     :param user: User instance
-    :param site: Site instance
     """
-    return Site.objects.filter(usersite__user=user, pk=site.pk).exists()
+    return queryset.filter(site_filter_for_model(queryset.model, user))
+
+
+def select_site_relation(queryset):
+    """Returns `queryset` that follows the registered site relation
+    of its model with select_related, so checking site access
+    of its objects doesn't issue additional queries.
+
+    The last hop of the relation is never followed, as site checks
+    only need the value of the foreign key to Site.
+
+    :param queryset: QuerySet instance
+    """
+    extension = get_extension()
+    model = extension.get_registered_model(queryset.model)
+    if model is None:
+        return queryset
+    path = extension.site_permission_lookups[model].rpartition("__")[0]
+    if not path:
+        return queryset
+    return queryset.select_related(path)
+
+
+class SitePermissionsModelAdminMixin(ObjectPermissionsModelAdminMixin):
+    """ModelAdmin mixin that checks per-object permissions
+    and limits the changelist to objects related to sites
+    the user has access to.
+
+    The registered site relation is fetched along with objects
+    (this also applies to `get_object`, which uses `get_queryset`),
+    so per-object permission checks don't issue additional queries.
+    Objects on other sites are denied without going through
+    authentication backends.
+    """
+
+    def has_view_permission(self, request, obj=None):
+        if not user_can_access(request.user, obj):
+            return False
+        return super().has_view_permission(request, obj)
 
+    def has_change_permission(self, request, obj=None):
+        if not user_can_access(request.user, obj):
+            return False
+        return super().has_change_permission(request, obj)
 
+    def has_delete_permission(self, request, obj=None):
+        if not user_can_access(request.user, obj):
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if user_has_global_site_access(request.user):
+            return queryset
+        queryset = select_site_relation(queryset)
+        return filter_queryset_by_site_access(queryset, request.user)
+
+    def response_action(self, request, queryset):
+        """Reports how many selected objects were skipped by an admin
+        action, as they're related to sites the user doesn't have
+        access to, using a single query.
+
+        Actions receive the changelist queryset, which is already
+        limited by `get_queryset`, so they don't need to check
+        site access of each object.
+        """
+        if user_has_global_site_access(request.user):
+            return super().response_action(request, queryset)
+        selected = set(request.POST.getlist(ACTION_CHECKBOX_NAME))
+        if selected and request.POST.get("select_across") != "1":
+            skipped = len(selected) - queryset.filter(pk__in=selected).count()
+            if skipped:
+                self.message_user(
+                    request,
+                    ngettext(
+                        "%(count)d selected object was skipped, as it's related "
+                        "to a site you don't have access to.",
+                        "%(count)d selected objects were skipped, as they're related "
+                        "to sites you don't have access to.",
+                        skipped,
+                    )
+                    % {"count": skipped},
+                    messages.WARNING,
+                )
+        return super().response_action(request, queryset)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        return self._limit_choices_by_site_access(formfield, request)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_manytomany(db_field, request, **kwargs)
+        return self._limit_choices_by_site_access(formfield, request)
+
+    def _limit_choices_by_site_access(self, formfield, request):
+        """Limits choices of `formfield` to objects related to sites
+        the user has access to, or to these sites themselves for
+        relations to Site. Both rendered options and validation
+        of submitted values are affected.
+
+        Autocomplete and raw ID lookups go through the admin of
+        the related model, so they're limited by its `get_queryset`.
+        """
+        if getattr(formfield, "queryset", None) is None:
+            return formfield
+        if user_has_global_site_access(request.user):
+            return formfield
+        queryset = formfield.queryset
+        if issubclass(queryset.model, Site):
+            formfield.queryset = queryset.filter(pk__in=get_user_site_ids(request.user))
+        else:
+            formfield.queryset = filter_queryset_by_site_access(queryset, request.user)
+        return formfield
+
+
+@lru_cache(maxsize=None)
 def admin_factory(admin_class, mixin):
     """A class factory returning subclass of `mixin` and `admin_class`.
 
+    Generated classes are cached, so models sharing an admin class
+    share the generated subclass as well.
+
     :param admin_class: Existing admin class
     :param mixin: Mixin class
     :return: A subclass of `mixin` and `admin_class`
@@ -68,7 +676,8 @@ def _replace_admin_for_model(modeladmin, mixin, admin_site):
 
 def replace_admin_for_model(model, admin_site=None):
     """Replace existing admin class registered for `model` with
-    a subclass that includes per-object permissions checking.
+    a subclass that includes per-object permissions checking
+    and site-scoped querysets.
 
     :param models: Model class
     :param admin_site: AdminSite instance
@@ -79,4 +688,4 @@ def replace_admin_for_model(model, admin_site=None):
         modeladmin = admin_site._registry[model]
     except KeyError:
         return
-    _replace_admin_for_model(modeladmin, ObjectPermissionsModelAdminMixin, admin_site)
+    _replace_admin_for_model(modeladmin, SitePermissionsModelAdminMixin, admin_site)
@@ -0,0 +1,112 @@
+from collections import Counter, defaultdict
+from functools import wraps
+from inspect import signature
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Registered collectors. Instrumented functions only measure anything
+# when this list is not empty.
+collectors = []
+
+
+class BaseCollector(object):
+    """Interface of objects receiving instrumentation data."""
+
+    def timing(self, name, duration, model=None):
+        """Called with the time (in seconds) spent in instrumented
+        function `name`.
+
+        :param name: Name of the instrumented function
+        :param duration: Time spent in seconds
+        :param model: Model class of the checked object, if known
+        """
+
+    def increment(self, name, model=None):
+        """Called when event `name` occurs, e.g. ``"db_hit"``
+        or ``"cache_hit"``.
+
+        :param name: Event name
+        :param model: Model class related to the event, if known
+        """
+
+
+class MemoryCollector(BaseCollector):
+    """Collector aggregating timings and counters in memory,
+    keyed by ``(name, model)``.
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.counters = Counter()
+
+    def timing(self, name, duration, model=None):
+        self.timings[name, model].append(duration)
+
+    def increment(self, name, model=None):
+        self.counters[name, model] += 1
+
+
+def register_collector(collector):
+    collectors.append(collector)
+
+
+def unregister_collector(collector):
+    collectors.remove(collector)
+
+
+def load_collectors():
+    """Registers collectors listed (as dotted paths to classes)
+    in ``DJANGOCMS_FIL_PERMISSIONS_COLLECTORS`` setting.
+    """
+    for path in getattr(settings, "DJANGOCMS_FIL_PERMISSIONS_COLLECTORS", []):
+        register_collector(import_string(path)())
+
+
+def increment(name, model=None):
+    for collector in collectors:
+        collector.increment(name, model)
+
+
+def instrument(name, obj_arg=None):
+    """Decorator reporting time spent in the decorated function
+    to registered collectors.
+
+    :param name: Name reported to collectors
+    :param obj_arg: Name of the argument holding the checked object,
+                    used to report its model
+    """
+
+    def decorator(func):
+        func_signature = signature(func)
+        parameters = list(func_signature.parameters)
+        obj_index = parameters.index(obj_arg) if obj_arg else None
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not collectors:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = perf_counter() - start
+                model = None
+                if obj_index is not None:
+                    if obj_index < len(args):
+                        obj = args[obj_index]
+                    else:
+                        obj = kwargs.get(obj_arg)
+                    if obj is not None:
+                        model = obj.__class__
+                for collector in collectors:
+                    collector.timing(name, duration, model)
+
+        # Keeps the signature visible to introspection (e.g. by rules'
+        # predicates, which count arguments of the wrapped function)
+        wrapper.__signature__ = func_signature
+        return wrapper
+
+    return decorator
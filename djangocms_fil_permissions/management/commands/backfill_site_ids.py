@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...helpers import get_extension
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills denormalized site fields of models registered "
+        "for per-site permissions from their site relations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Labels of models to backfill (e.g. polls.Vote). All by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        extension = get_extension()
+        relations = {
+            model._meta.label_lower: (model, relation)
+            for model, relation in extension.denormalized_site_relations.items()
+        }
+        labels = [label.lower() for label in options["models"]] or sorted(relations)
+        for label in labels:
+            try:
+                model, relation = relations[label]
+            except KeyError:
+                raise CommandError("%s has no denormalized site field" % label)
+            updated = self.backfill(model, relation, options["batch_size"])
+            self.stdout.write("%s: %d objects updated" % (label, updated))
+
+    def backfill(self, model, relation, batch_size):
+        """Updates objects of `model` with denormalized site out of sync
+        with `relation`, in batches of `batch_size` objects.
+
+        Returns the number of updated objects.
+        """
+        field_name = get_extension().site_permission_lookups[model]
+        attname = model._meta.get_field(field_name).attname
+        manager = model._default_manager
+        rows = manager.values_list("pk", attname, relation).order_by("pk")
+        updated = 0
+        pending = []
+        for pk, current_site_id, site_id in rows.iterator(chunk_size=batch_size):
+            if current_site_id != site_id:
+                pending.append((site_id, pk))
+            if len(pending) >= batch_size:
+                updated += self.update(manager, attname, pending)
+                pending = []
+        return updated + self.update(manager, attname, pending)
+
+    def update(self, manager, attname, pending):
+        """Updates objects in `pending` (a list of (site_id, pk) pairs)
+        with a single query per site.
+        """
+        pks_by_site_id = defaultdict(list)
+        for site_id, pk in pending:
+            pks_by_site_id[site_id].append(pk)
+        return sum(
+            manager.filter(pk__in=pks).update(**{attname: site_id})
+            for site_id, pks in pks_by_site_id.items()
+        )
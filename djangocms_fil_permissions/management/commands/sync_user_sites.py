@@ -0,0 +1,192 @@
+import csv
+import json
+import sys
+from functools import partial
+from itertools import islice
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.exceptions import FieldError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ... import cache
+from ...models import UserSite
+
+
+ASSIGN = "assign"
+REVOKE = "revoke"
+
+
+class Command(BaseCommand):
+    help = (
+        "Assigns users to sites and revokes their access in bulk. "
+        "Reads CSV or JSON lines records with user, site and action "
+        "(assign or revoke, assign by default) fields."
+    )
+    stealth_options = ("stdin",)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input", nargs="?", default="-", help="Input file, stdin by default."
+        )
+        parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+        parser.add_argument(
+            "--user-field",
+            default="username",
+            help="User model field identifying users in the input.",
+        )
+        parser.add_argument(
+            "--site-field",
+            default="domain",
+            help="Site model field identifying sites in the input.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.user_field = options["user_field"]
+        self.site_field = options["site_field"]
+        self.validate_field(get_user_model(), self.user_field, "--user-field")
+        self.validate_field(Site, self.site_field, "--site-field")
+        self.site_ids = {}
+        self.affected_user_ids = set()
+        self.counts = dict.fromkeys(["records", ASSIGN, REVOKE, "skipped"], 0)
+        start = perf_counter()
+        if options["input"] == "-":
+            self.sync(options.get("stdin", sys.stdin), options)
+        else:
+            with open(options["input"], newline="") as stream:
+                self.sync(stream, options)
+        duration = perf_counter() - start
+        self.stdout.write(
+            "Processed %(records)d records: %(assign)d assigned, "
+            "%(revoke)d revoked, %(skipped)d skipped" % self.counts
+        )
+        self.stdout.write(
+            "%.2fs, %d records/s"
+            % (duration, self.counts["records"] / duration if duration else 0)
+        )
+
+    def validate_field(self, model, field, option):
+        try:
+            model._default_manager.filter(**{"%s__in" % field: []})
+        except FieldError:
+            raise CommandError(
+                "%s: %s has no field %s" % (option, model.__name__, field)
+            )
+
+    def sync(self, stream, options):
+        if options["format"] == "csv":
+            records = self.read_csv(stream)
+        else:
+            records = self.read_jsonl(stream)
+        with transaction.atomic():
+            while True:
+                chunk = list(islice(records, options["chunk_size"]))
+                if not chunk:
+                    break
+                self.sync_chunk(chunk)
+            # Caches are invalidated once changes are committed,
+            # also when the command runs in an outer transaction
+            transaction.on_commit(
+                partial(self.invalidate_caches, set(self.affected_user_ids))
+            )
+
+    def read_csv(self, stream):
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield self.parse_record(reader.line_num, record)
+
+    def read_jsonl(self, stream):
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise CommandError("Line %d: invalid JSON: %s" % (line_number, e))
+            if not isinstance(record, dict):
+                raise CommandError("Line %d: expected an object" % line_number)
+            yield self.parse_record(line_number, record)
+
+    def parse_record(self, line_number, record):
+        """Returns a tuple of (line_number, user, site, action)
+        read from `record`.
+        """
+        for field in ("user", "site"):
+            if record.get(field) in (None, ""):
+                raise CommandError("Line %d: missing %s" % (line_number, field))
+        action = record.get("action") or ASSIGN
+        if action not in (ASSIGN, REVOKE):
+            raise CommandError("Line %d: unknown action %s" % (line_number, action))
+        return line_number, str(record["user"]), str(record["site"]), action
+
+    def sync_chunk(self, records):
+        """Applies a chunk of records, with a constant number of queries
+        regardless of its size. When the same membership appears
+        more than once, the last record wins.
+        """
+        self.counts["records"] += len(records)
+        user_ids = self.get_user_ids({user for _, user, _, _ in records})
+        site_ids = self.get_site_ids({site for _, _, site, _ in records})
+        actions = {}
+        for line_number, user, site, action in records:
+            user_id = user_ids.get(user)
+            site_id = site_ids.get(site)
+            if user_id is None or site_id is None:
+                self.stderr.write(
+                    "Line %d: unknown user or site: %s, %s" % (line_number, user, site)
+                )
+                self.counts["skipped"] += 1
+                continue
+            actions[user_id, site_id] = action
+        existing = {
+            (user_id, site_id): pk
+            for pk, user_id, site_id in UserSite.objects.filter(
+                user_id__in={user_id for user_id, _ in actions},
+                site_id__in={site_id for _, site_id in actions},
+            ).values_list("pk", "user_id", "site_id")
+        }
+        to_create = []
+        to_delete = []
+        for (user_id, site_id), action in actions.items():
+            pk = existing.get((user_id, site_id))
+            if action == ASSIGN and pk is None:
+                to_create.append(UserSite(user_id=user_id, site_id=site_id))
+            elif action == REVOKE and pk is not None:
+                to_delete.append(pk)
+            else:
+                self.counts["skipped"] += 1
+                continue
+            self.affected_user_ids.add(user_id)
+        UserSite.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_delete:
+            UserSite.objects.filter(pk__in=to_delete).delete()
+        self.counts[ASSIGN] += len(to_create)
+        self.counts[REVOKE] += len(to_delete)
+
+    def invalidate_caches(self, user_ids):
+        for user_id in user_ids:
+            cache.invalidate_user(user_id)
+
+    def get_user_ids(self, values):
+        """Returns a mapping of provided user identifiers to user IDs."""
+        rows = (
+            get_user_model()
+            ._default_manager.filter(**{"%s__in" % self.user_field: values})
+            .values_list(self.user_field, "pk")
+        )
+        return {str(value): pk for value, pk in rows}
+
+    def get_site_ids(self, values):
+        """Returns a mapping of provided site identifiers to site IDs.
+        Sites are looked up once per command run.
+        """
+        values = values - self.site_ids.keys()
+        if values:
+            rows = Site.objects.filter(
+                **{"%s__in" % self.site_field: values}
+            ).values_list(self.site_field, "pk")
+            self.site_ids.update((str(value), pk) for value, pk in rows)
+        return self.site_ids
@@ -0,0 +1,61 @@
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+from .helpers import filter_queryset_by_site_access, get_extension
+
+
+class SiteScopedQuerySetMixin(object):
+    """QuerySet mixin for models registered for per-site permissions."""
+
+    def for_user(self, user):
+        """Returns objects related to sites user has access to,
+        using the site relation the model was registered with.
+        The restriction is a single filter applied in SQL.
+
+        Raises ImproperlyConfigured if the model isn't registered,
+        rather than returning objects of all sites.
+
+        :param user: User instance
+        """
+        if get_extension().get_registered_model(self.model) is None:
+            raise ImproperlyConfigured(
+                "%s is not registered for per-site permissions" % self.model.__name__
+            )
+        return filter_queryset_by_site_access(self, user)
+
+
+class SiteScopedQuerySet(SiteScopedQuerySetMixin, models.QuerySet):
+    pass
+
+
+@lru_cache(maxsize=None)
+def site_scoped_manager(manager_class):
+    """Returns a subclass of `manager_class` which querysets support
+    ``for_user``, for models that already use a custom manager.
+
+    Generated classes are cached, so models sharing a manager class
+    share the generated subclass as well.
+
+    Example:
+    class Poll(models.Model):
+        objects = site_scoped_manager(PollManager)()
+
+    :param manager_class: Manager class
+    """
+    queryset_class = manager_class._queryset_class
+    if not issubclass(queryset_class, SiteScopedQuerySetMixin):
+        queryset_class = type(
+            "SiteScoped%s" % queryset_class.__name__,
+            (SiteScopedQuerySetMixin, queryset_class),
+            {},
+        )
+    return manager_class.from_queryset(
+        queryset_class, "SiteScoped%s" % manager_class.__name__
+    )
+
+
+SiteScopedManager = models.Manager.from_queryset(
+    SiteScopedQuerySet, "SiteScopedManager"
+)
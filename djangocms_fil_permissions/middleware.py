@@ -0,0 +1,49 @@
+from django.utils.deprecation import MiddlewareMixin
+
+from .helpers import get_user_site_ids, user_has_global_site_access
+
+
+class SiteAccess(object):
+    """Immutable set of sites a user has access to.
+
+    Supports ``in`` checks with Site instances or IDs, e.g.
+    ``{% if poll.site_id in request.user.site_access %}`` in templates.
+    """
+
+    __slots__ = ("site_ids", "is_global")
+
+    def __init__(self, site_ids, is_global=False):
+        object.__setattr__(self, "site_ids", frozenset(site_ids))
+        object.__setattr__(self, "is_global", is_global)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SiteAccess objects are immutable")
+
+    def __contains__(self, site):
+        return self.is_global or getattr(site, "pk", site) in self.site_ids
+
+    def __repr__(self):
+        return "<SiteAccess site_ids=%r is_global=%r>" % (
+            sorted(self.site_ids),
+            self.is_global,
+        )
+
+
+class SiteAccessMiddleware(MiddlewareMixin):
+    """Loads site access of the authenticated user once per request
+    and attaches it to ``request.user`` as ``site_access``.
+
+    Site IDs are cached on the user object, so permission checks
+    made while handling the request don't issue additional queries.
+
+    Must be placed after ``AuthenticationMiddleware``.
+    """
+
+    def process_request(self, request):
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return
+        if user_has_global_site_access(user):
+            user.site_access = SiteAccess(frozenset(), is_global=True)
+        else:
+            user.site_access = SiteAccess(get_user_site_ids(user))
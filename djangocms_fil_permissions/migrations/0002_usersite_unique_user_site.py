@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def remove_duplicates(apps, schema_editor):
+    """Keeps only the oldest UserSite row for each (user, site) pair."""
+    UserSite = apps.get_model("djangocms_fil_permissions", "UserSite")
+    db_alias = schema_editor.connection.alias
+    queryset = UserSite.objects.using(db_alias)
+    older = queryset.filter(
+        user_id=models.OuterRef("user_id"),
+        site_id=models.OuterRef("site_id"),
+        pk__lt=models.OuterRef("pk"),
+    )
+    pks = list(
+        queryset.filter(models.Exists(older)).order_by().values_list("pk", flat=True)
+    )
+    for start in range(0, len(pks), BATCH_SIZE):
+        queryset.filter(pk__in=pks[start : start + BATCH_SIZE]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0002_alter_domain_unique"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("djangocms_fil_permissions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="usersite", unique_together={("user", "site")}
+        ),
+        migrations.AddIndex(
+            model_name="usersite",
+            index=models.Index(
+                fields=["site", "user"], name="fil_perm_usersite_site_user"
+            ),
+        ),
+    ]
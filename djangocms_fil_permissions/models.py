@@ -6,3 +6,9 @@ from django.db import models
 class UserSite(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = (("user", "site"),)
+        indexes = [
+            models.Index(fields=["site", "user"], name="fil_perm_usersite_site_user")
+        ]
@@ -2,6 +2,15 @@ from django.core.exceptions import PermissionDenied
 
 from rules.rulesets import RuleSet
 
+from .helpers import (
+    auser_can_access,
+    clear_site_cache,
+    get_user_site_ids,
+    memoize_site_access,
+    user_can_access,
+    user_has_global_site_access,
+)
+from .instrumentation import instrument
 from .rules import has_site_access
 
 
@@ -9,6 +18,30 @@ site_permissions = RuleSet()
 site_permissions.add_rule("site_perm", has_site_access)
 
 
+def is_site_perm_replaced():
+    """Returns True if the "site_perm" rule of `site_permissions` has
+    been replaced by the project, so object checks need to go through it
+    instead of comparing site IDs.
+    """
+    return site_permissions.get("site_perm") is not has_site_access
+
+
+def check_site_perm(user, obj):
+    """Tests the "site_perm" rule of `site_permissions`.
+
+    The default `has_site_access` predicate is called directly,
+    skipping the invocation context set up by ``rules``, and its
+    results are memoized with `memoize_site_access`. Replaced rules
+    go through ``RuleSet.test_rule``.
+
+    :param user: User instance
+    :param obj: Object checked against
+    """
+    if is_site_perm_replaced():
+        return site_permissions.test_rule("site_perm", user, obj)
+    return memoize_site_access(user, obj, has_site_access.fn)
+
+
 class SitePermissionBackend(object):
     """Authentication backend that checks row-level permissions granted
     on site-level.
@@ -20,6 +53,7 @@ class SitePermissionBackend(object):
         """
         return None
 
+    @instrument("has_perm", obj_arg="obj")
     def has_perm(self, user, perm, obj=None):
         """Checks if ``user` belongs to a site associated with ``obj``.
 
@@ -27,19 +61,58 @@ class SitePermissionBackend(object):
         permissions and ``user`` does not belong to the same site
         as ``obj``.
 
-        In any other case (``user`` passed the test or ``obj``
-        is not registered for site-level permissions,
-        no ``obj`` is passed), permission checking continues to the
-        next authentication backend.
+        In any other case (``user`` passed the test, has access
+        to all sites, ``obj`` is not registered for site-level
+        permissions or no ``obj`` is passed), permission checking
+        continues to the next authentication backend.
 
         :param user: User instance
         :param perm: Permission codename
         :param obj: Object checked against
         """
-        if not site_permissions.test_rule("site_perm", user, obj):
+        if obj is None or user_has_global_site_access(user):
+            return None
+        if not check_site_perm(user, obj):
             raise PermissionDenied()
         return None
 
+    def has_site_access(self, user, obj):
+        """Returns True if ``user`` has access to the site associated
+        with ``obj``, otherwise returns False.
+
+        Unlike ``has_perm``, it doesn't raise PermissionDenied,
+        so it's better suited for checking many objects.
+
+        :param user: User instance
+        :param obj: Object checked against
+        """
+        return user_can_access(user, obj)
+
+    async def ahas_site_access(self, user, obj):
+        """Async counterpart of ``has_site_access``, for async views.
+
+        :param user: User instance
+        :param obj: Object checked against
+        """
+        return await auser_can_access(user, obj)
+
+    def get_site_ids(self, user):
+        """Returns a frozenset of IDs of sites ``user`` belongs to.
+
+        Site IDs are loaded once and cached on the ``user`` object.
+
+        :param user: User instance
+        """
+        return get_user_site_ids(user)
+
+    def clear_site_cache(self, user):
+        """Clears site IDs cached on the ``user`` object, e.g. after
+        ``user`` has been granted access to a new site.
+
+        :param user: User instance
+        """
+        clear_site_cache(user)
+
     def has_module_perms(self, user, app_label):
         """Pass module permission checking process to the next
         authentication backend.
@@ -1,11 +1,13 @@
 import rules
 
-from .helpers import get_site_for_obj, user_has_access_to_site
+from .helpers import get_site_id_for_obj, get_user_site_ids
+from .instrumentation import instrument
 
 
 @rules.predicate
+@instrument("has_site_access", obj_arg="obj")
 def has_site_access(user, obj):
-    site = get_site_for_obj(obj)
-    if site is None:
+    site_id = get_site_id_for_obj(obj)
+    if site_id is None:
         return True
-    return user_has_access_to_site(user, site)
+    return site_id in get_user_site_ids(user)
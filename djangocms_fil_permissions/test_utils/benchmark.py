@@ -0,0 +1,116 @@
+import json
+import os
+from time import perf_counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ..models import UserSite
+from .factories import SiteFactory, UserFactory
+from .polls.models import Answer, Comment, Poll
+
+
+# Models registered with site relations of increasing length
+MODELS_BY_DEPTH = {1: Poll, 2: Answer, 3: Comment}
+
+
+def get_setting(name, default):
+    """Returns benchmark parameter from ``BENCHMARK_<NAME>``
+    environment variable.
+    """
+    return type(default)(os.environ.get("BENCHMARK_%s" % name, default))
+
+
+def get_depths():
+    """Returns relation depths set in ``BENCHMARK_DEPTHS`` environment
+    variable (all of `MODELS_BY_DEPTH` by default).
+    """
+    depths = get_setting("DEPTHS", ",".join(map(str, MODELS_BY_DEPTH)))
+    depths = [int(depth) for depth in depths.split(",")]
+    for depth in depths:
+        if depth not in MODELS_BY_DEPTH:
+            raise ValueError(
+                "BENCHMARK_DEPTHS supports relation depths %s, got %d"
+                % (", ".join(map(str, MODELS_BY_DEPTH)), depth)
+            )
+    return depths
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = int(round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def report(result):
+    """Appends `result` as a JSON line to the file set in
+    ``BENCHMARK_OUTPUT`` environment variable (if any).
+    """
+    path = os.environ.get("BENCHMARK_OUTPUT")
+    if path:
+        with open(path, "a") as f:
+            f.write(json.dumps(result, sort_keys=True) + "\n")
+
+
+def run_benchmark(name, func, calls, **params):
+    """Calls `func` with each of `calls` argument tuples, measuring
+    latency of every call and the number of queries issued overall.
+
+    Returns (and reports) a dict with checks per second,
+    p50/p99 latency in milliseconds and the query count.
+
+    :param name: Benchmark name
+    :param func: Callable under test
+    :param calls: A list of argument tuples
+    :param params: Extra parameters included in the result
+    """
+    timings = []
+    with CaptureQueriesContext(connection) as context:
+        for args in calls:
+            start = perf_counter()
+            func(*args)
+            timings.append(perf_counter() - start)
+    total = sum(timings)
+    result = dict(
+        params,
+        name=name,
+        checks=len(timings),
+        checks_per_second=len(timings) / total if total else None,
+        p50_ms=percentile(timings, 50) * 1000,
+        p99_ms=percentile(timings, 99) * 1000,
+        queries=len(context.captured_queries),
+    )
+    report(result)
+    return result
+
+
+def create_dataset(sites, users, objects):
+    """Creates `sites` sites, `users` users (each with access to
+    every other site) and `objects` polls, answers and comments
+    spread evenly across sites.
+
+    Returns a tuple of (sites, users).
+    """
+    sites = SiteFactory.create_batch(sites)
+    users = UserFactory.create_batch(users)
+    UserSite.objects.bulk_create(
+        UserSite(user=user, site=site)
+        for user_index, user in enumerate(users)
+        for site_index, site in enumerate(sites)
+        if site_index % 2 == user_index % 2
+    )
+    Poll.objects.bulk_create(
+        Poll(text="poll %d" % index, site=sites[index % len(sites)])
+        for index in range(objects)
+    )
+    polls = list(Poll.objects.order_by("pk"))
+    Answer.objects.bulk_create(
+        Answer(text="answer %d" % index, poll=polls[index % len(polls)])
+        for index in range(objects)
+    )
+    answers = list(Answer.objects.order_by("pk"))
+    Comment.objects.bulk_create(
+        Comment(text="comment %d" % index, answer=answers[index % len(answers)])
+        for index in range(objects)
+    )
+    return sites, users
@@ -5,7 +5,7 @@ import factory
 from factory.fuzzy import FuzzyText
 
 from ..models import UserSite
-from .polls.models import Answer, Poll
+from .polls.models import Answer, Comment, Poll, Vote
 
 
 class SiteFactory(factory.django.DjangoModelFactory):
@@ -31,6 +31,21 @@ class AnswerFactory(factory.django.DjangoModelFactory):
         model = Answer
 
 
+class CommentFactory(factory.django.DjangoModelFactory):
+    text = FuzzyText(length=12)
+    answer = factory.SubFactory(AnswerFactory)
+
+    class Meta:
+        model = Comment
+
+
+class VoteFactory(factory.django.DjangoModelFactory):
+    answer = factory.SubFactory(AnswerFactory)
+
+    class Meta:
+        model = Vote
+
+
 class UserFactory(factory.django.DjangoModelFactory):
     username = FuzzyText(length=12)
     first_name = factory.Faker("first_name")
@@ -1,8 +1,14 @@
 from cms.app_base import CMSAppConfig
 
-from .models import Answer, Poll
+from .models import Answer, Comment, Poll, Vote
 
 
 class PollsCMSAppConfig(CMSAppConfig):
     djangocms_fil_permissions_enabled = True
-    site_permission_models = {Poll: "site", Answer: "poll__site"}
+    site_permission_models = {
+        Poll: "site",
+        Answer: "poll__site",
+        Comment: "answer__poll__site",
+        Vote: "answer__poll__site",
+    }
+    site_permission_denormalized_fields = {Vote: "site"}
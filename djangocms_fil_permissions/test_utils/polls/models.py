@@ -1,18 +1,41 @@
 from django.contrib.sites.models import Site
 from django.db import models
 
+from djangocms_fil_permissions.managers import SiteScopedManager
+
 
 class Poll(models.Model):
     text = models.CharField(max_length=255)
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
 
+    objects = SiteScopedManager()
+
     def __str__(self):
         return self.text
 
 
+class PollProxy(Poll):
+    class Meta:
+        proxy = True
+
+
 class Answer(models.Model):
     text = models.CharField(max_length=255)
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
 
     def __str__(self):
         return self.text
+
+
+class Comment(models.Model):
+    text = models.CharField(max_length=255)
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
+
+    def __str__(self):
+        return self.text
+
+
+class Vote(models.Model):
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
+    # Denormalized answer.poll.site, kept in sync by djangocms_fil_permissions
+    site = models.ForeignKey(Site, null=True, editable=False, on_delete=models.CASCADE)
@@ -3,7 +3,7 @@ from setuptools import find_packages, setup
 import djangocms_fil_permissions
 
 
-INSTALL_REQUIREMENTS = ["Django>=1.11,<2.0", "django-cms>=3.5.0", "rules"]
+INSTALL_REQUIREMENTS = ["Django>=4.1", "django-cms>=4.1.0", "rules"]
 
 
 setup(
@@ -0,0 +1,244 @@
+import os
+from functools import partial
+from unittest.mock import patch
+
+from django.contrib import admin
+from django.contrib.auth.models import Permission, User
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from menus.base import NavigationNode
+
+from djangocms_fil_permissions.cms_config import PermissionsCMSExtension
+from djangocms_fil_permissions.helpers import (
+    filter_nodes_by_site_access,
+    get_site_id_for_obj,
+    replace_admin_for_model,
+    select_site_relation,
+)
+from djangocms_fil_permissions.permissions import (
+    SitePermissionBackend,
+    check_site_perm,
+    site_permissions,
+)
+from djangocms_fil_permissions.test_utils.benchmark import (
+    MODELS_BY_DEPTH,
+    create_dataset,
+    get_depths,
+    get_setting,
+    run_benchmark,
+)
+from djangocms_fil_permissions.test_utils.factories import CommentFactory, PollFactory
+from djangocms_fil_permissions.test_utils.polls.models import Answer, Poll
+
+
+class StartupBenchmarkTestCase(TestCase):
+    """Measures configuration of the extension with ``BENCHMARK_MODELS``
+    registered models and patching of an admin site.
+    """
+
+    def test_configure_models(self):
+        count = get_setting("MODELS", 200)
+        models = [type("Model%d" % index, (), {}) for index in range(count)]
+
+        def configure_models():
+            extension = PermissionsCMSExtension()
+            extension.configure_models({model: "foo__site" for model in models})
+
+        with patch(
+            "djangocms_fil_permissions.helpers._replace_admin_for_model"
+        ) as replace:
+            run_benchmark(
+                "configure_models",
+                configure_models,
+                [()] * get_setting("ITERATIONS", 5),
+                models=count,
+            )
+        replace.assert_not_called()
+
+    def test_patch_admin_site(self):
+        extension = PermissionsCMSExtension()
+        extension.register_model(Poll, "site")
+        extension.register_model(Answer, "poll__site")
+        sites = []
+        for _ in range(get_setting("ITERATIONS", 5)):
+            site = admin.AdminSite()
+            site.register(Poll)
+            site.register(Answer)
+            sites.append((site,))
+
+        result = run_benchmark("patch_admin_site", extension.patch_admin_site, sites)
+
+        self.assertEqual(result["queries"], 0)
+
+
+class BenchmarkSettingsTestCase(SimpleTestCase):
+    def test_get_depths(self):
+        with patch.dict(os.environ, {"BENCHMARK_DEPTHS": "3,1"}):
+            self.assertEqual(get_depths(), [3, 1])
+
+    def test_get_depths_unsupported(self):
+        with patch.dict(os.environ, {"BENCHMARK_DEPTHS": "1,4"}):
+            with self.assertRaisesMessage(ValueError, "got 4"):
+                get_depths()
+
+
+class PermissionBenchmarkTestCase(TestCase):
+    """Measures throughput and query counts of site permission checks.
+
+    Dataset size can be configured with ``BENCHMARK_SITES``,
+    ``BENCHMARK_USERS``, ``BENCHMARK_OBJECTS``, ``BENCHMARK_DEPTHS``
+    (comma-separated relation depths: 1 for Poll, 2 for Answer, 3 for Comment)
+    and ``BENCHMARK_ITERATIONS`` environment variables. Results are written as JSON lines to the file
+    set in ``BENCHMARK_OUTPUT``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.params = {
+            "sites": get_setting("SITES", 5),
+            "users": get_setting("USERS", 2),
+            "objects": get_setting("OBJECTS", 100),
+        }
+        cls.sites, cls.users = create_dataset(**cls.params)
+
+    def get_user(self):
+        # Fresh user object without any cached site IDs
+        return User.objects.get(pk=self.users[0].pk)
+
+    def get_objects(self, model):
+        return list(select_site_relation(model.objects.all()))
+
+    def test_has_perm(self):
+        backend = SitePermissionBackend()
+        for depth in get_depths():
+            model = MODELS_BY_DEPTH[depth]
+            objects = self.get_objects(model)
+            user = self.get_user()
+            perm = "polls.change_%s" % model._meta.model_name
+
+            def has_perm(obj):
+                try:
+                    backend.has_perm(user, perm, obj)
+                except PermissionDenied:
+                    pass
+
+            with self.subTest(depth=depth):
+                result = run_benchmark(
+                    "has_perm",
+                    has_perm,
+                    [(obj,) for obj in objects],
+                    depth=depth,
+                    **self.params
+                )
+                self.assertEqual(result["queries"], 1)
+
+    def test_site_perm(self):
+        """Compares testing the "site_perm" rule through ``rules``
+        with `check_site_perm`, checking every object twice.
+        """
+        for depth in get_depths():
+            model = MODELS_BY_DEPTH[depth]
+            calls = [(obj,) for obj in self.get_objects(model)] * 2
+            for name, check in [
+                ("test_rule", partial(site_permissions.test_rule, "site_perm")),
+                ("check_site_perm", check_site_perm),
+            ]:
+                user = self.get_user()
+                with self.subTest(depth=depth, path=name):
+                    result = run_benchmark(
+                        "site_perm_%s" % name,
+                        partial(check, user),
+                        calls,
+                        depth=depth,
+                        **self.params
+                    )
+                    self.assertEqual(result["queries"], 1)
+
+    def test_get_site_id_for_obj(self):
+        for depth in get_depths():
+            model = MODELS_BY_DEPTH[depth]
+            with self.subTest(depth=depth):
+                result = run_benchmark(
+                    "get_site_id_for_obj",
+                    get_site_id_for_obj,
+                    [(obj,) for obj in self.get_objects(model)],
+                    depth=depth,
+                    **self.params
+                )
+                self.assertEqual(result["queries"], 0)
+
+    def test_changelist(self):
+        site = admin.AdminSite()
+        request_factory = RequestFactory()
+        for depth in get_depths():
+            model = MODELS_BY_DEPTH[depth]
+            site.register(model)
+            replace_admin_for_model(model, site)
+            modeladmin = site._registry[model]
+            user = self.get_user()
+            user.user_permissions.set(
+                Permission.objects.filter(content_type__app_label="polls")
+            )
+            backend = SitePermissionBackend()
+            perm = "polls.change_%s" % model._meta.model_name
+
+            def render_changelist():
+                request = request_factory.get("/")
+                request.user = self.get_user()
+                changelist = modeladmin.get_changelist_instance(request)
+                for obj in changelist.result_list:
+                    backend.has_perm(request.user, perm, obj)
+                return changelist
+
+            iterations = get_setting("ITERATIONS", 5)
+            with self.subTest(depth=depth):
+                run_benchmark(
+                    "changelist",
+                    render_changelist,
+                    [()] * iterations,
+                    depth=depth,
+                    **self.params
+                )
+                # Query count doesn't depend on the number of visible objects.
+                # All of them fit on a single page, before and after
+                # adding objects on a site the user has access to.
+                modeladmin.list_per_page = model.objects.count() + 10
+                with CaptureQueriesContext(connection) as context:
+                    visible = len(render_changelist().result_list)
+                polls = PollFactory.create_batch(5, site=self.sites[0])
+                for poll in polls:
+                    CommentFactory(answer__poll=poll)
+                with self.assertNumQueries(len(context.captured_queries)):
+                    changelist = render_changelist()
+                self.assertEqual(len(changelist.result_list), visible + 5)
+
+    def test_filter_nodes(self):
+        count = get_setting("NODES", 10000)
+        width = get_setting("NODE_WIDTH", 10)
+
+        def build_nodes():
+            nodes = []
+            for index in range(count):
+                site = self.sites[index % len(self.sites)]
+                node = NavigationNode(
+                    "node %d" % index, "/", index, attr={"site_id": site.pk}
+                )
+                if index:
+                    node.parent = nodes[(index - 1) // width]
+                    node.parent.children.append(node)
+                nodes.append(node)
+            return nodes
+
+        iterations = get_setting("ITERATIONS", 5)
+        user = self.get_user()
+        result = run_benchmark(
+            "filter_nodes",
+            filter_nodes_by_site_access,
+            [(user, build_nodes()) for _ in range(iterations)],
+            nodes=count,
+            **self.params
+        )
+        self.assertEqual(result["queries"], 1)
@@ -0,0 +1,137 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from djangocms_fil_permissions import cache
+from djangocms_fil_permissions.helpers import get_user_site_ids
+from djangocms_fil_permissions.models import UserSite
+from djangocms_fil_permissions.test_utils.factories import (
+    SiteFactory,
+    UserFactory,
+    UserSiteFactory,
+)
+
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "permissions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "permissions",
+    },
+}
+
+
+@override_settings(CACHES=CACHES, DJANGOCMS_FIL_PERMISSIONS_CACHE="permissions")
+class CacheTestCase(TestCase):
+    def setUp(self):
+        caches["permissions"].clear()
+        cache.stats.reset()
+
+    def get_site_ids(self, user_id):
+        # Fresh user object, so per-object cache doesn't come into play
+        user = UserFactory._meta.model(pk=user_id)
+        return get_user_site_ids(user)
+
+    def test_cache_disabled(self):
+        usersite = UserSiteFactory()
+        with self.settings(DJANGOCMS_FIL_PERMISSIONS_CACHE=None):
+            with self.assertNumQueries(2):
+                self.get_site_ids(usersite.user_id)
+                self.get_site_ids(usersite.user_id)
+        self.assertEqual(cache.stats.hits, 0)
+        self.assertEqual(cache.stats.misses, 0)
+
+    def test_shared_between_user_objects(self):
+        usersite = UserSiteFactory()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_site_ids(usersite.user_id), {usersite.site_id})
+            self.assertEqual(self.get_site_ids(usersite.user_id), {usersite.site_id})
+        self.assertEqual(cache.stats.hits, 1)
+        self.assertEqual(cache.stats.misses, 1)
+
+    def test_timeout(self):
+        usersite = UserSiteFactory()
+        with self.settings(DJANGOCMS_FIL_PERMISSIONS_CACHE_TIMEOUT=0):
+            with self.assertNumQueries(2):
+                self.get_site_ids(usersite.user_id)
+                self.get_site_ids(usersite.user_id)
+
+    def test_invalidated_on_user_site_save(self):
+        usersite = UserSiteFactory()
+        self.get_site_ids(usersite.user_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            usersite2 = UserSiteFactory(user=usersite.user)
+
+        self.assertEqual(
+            self.get_site_ids(usersite.user_id), {usersite.site_id, usersite2.site_id}
+        )
+
+    def test_invalidated_on_user_site_delete(self):
+        usersite = UserSiteFactory()
+        self.get_site_ids(usersite.user_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            usersite.delete()
+
+        self.assertEqual(self.get_site_ids(usersite.user_id), frozenset())
+
+    def test_invalidated_on_site_delete(self):
+        usersite = UserSiteFactory()
+        self.get_site_ids(usersite.user_id)
+        generation = caches["permissions"].get(cache.GENERATION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            usersite.site.delete()
+
+        self.assertNotEqual(caches["permissions"].get(cache.GENERATION_KEY), generation)
+        self.assertEqual(self.get_site_ids(usersite.user_id), frozenset())
+
+    def test_invalidated_on_commit(self):
+        usersite = UserSiteFactory()
+        self.get_site_ids(usersite.user_id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            usersite.delete()
+            # Not committed yet, so a concurrent request would still
+            # read the old rows; the cached entry stays valid until commit
+            with self.assertNumQueries(0):
+                self.get_site_ids(usersite.user_id)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(self.get_site_ids(usersite.user_id), frozenset())
+
+    def test_invalidate_all(self):
+        usersite = UserSiteFactory()
+        self.get_site_ids(usersite.user_id)
+
+        cache.invalidate_all()
+
+        with self.assertNumQueries(1):
+            self.get_site_ids(usersite.user_id)
+
+    def test_invalidate_user_doesnt_affect_other_users(self):
+        usersite1 = UserSiteFactory()
+        usersite2 = UserSiteFactory()
+        self.get_site_ids(usersite1.user_id)
+        self.get_site_ids(usersite2.user_id)
+
+        cache.invalidate_user(usersite1.user_id)
+
+        with self.assertNumQueries(0):
+            self.get_site_ids(usersite2.user_id)
+        with self.assertNumQueries(1):
+            self.get_site_ids(usersite1.user_id)
+
+    def test_stale_entry_is_not_used(self):
+        usersite = UserSiteFactory()
+        site2 = SiteFactory()
+        # Entry computed for a version that got invalidated in the meantime
+        self.get_site_ids(usersite.user_id)
+        caches["permissions"].set(
+            cache._version_key(usersite.user_id), "new-version", None
+        )
+        UserSite.objects.filter(pk=usersite.pk).update(site=site2)
+
+        self.assertEqual(self.get_site_ids(usersite.user_id), {site2.pk})
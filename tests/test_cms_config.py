@@ -1,12 +1,23 @@
 from operator import attrgetter
 from unittest.mock import Mock, patch
+from weakref import WeakSet
 
 from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import Group
 from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
+from django.urls import URLResolver
 
 from djangocms_fil_permissions import cms_config
-from djangocms_fil_permissions.test_utils.polls.models import Answer, Poll
+from djangocms_fil_permissions.helpers import SitePermissionsModelAdminMixin
+from djangocms_fil_permissions.test_utils.polls.models import (
+    Answer,
+    Comment,
+    Poll,
+    PollProxy,
+    Vote,
+)
 
 
 class CMSConfigTestCase(TestCase):
@@ -59,6 +70,12 @@ class CMSConfigTestCase(TestCase):
         mock = Mock()
         self.assertEqual(getter(mock), mock.foo.bar)
 
+    def test_translate_relation_to_id(self):
+        extension = cms_config.PermissionsCMSExtension()
+        getter = extension.translate_relation_to_id("foo__bar")
+        mock = Mock()
+        self.assertEqual(getter(mock), mock.foo.bar_id)
+
     def test_register_model(self):
         extension = cms_config.PermissionsCMSExtension()
         with patch.object(extension, "translate_relation") as translate_relation:
@@ -67,6 +84,72 @@ class CMSConfigTestCase(TestCase):
         self.assertEqual(
             extension.site_permission_models[Poll], translate_relation.return_value
         )
+        self.assertEqual(extension.site_permission_lookups[Poll], "foo__site")
+        self.assertIn(Poll, extension.site_id_getters)
+
+    def test_register_denormalized_field(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.register_model(Vote, "answer__poll__site")
+
+        with patch.object(cms_config, "connect_denormalized_site") as connect:
+            extension.register_denormalized_field(Vote, "site")
+
+        connect.assert_called_once_with(Vote, "site", "answer__poll__site")
+        self.assertEqual(extension.site_permission_lookups[Vote], "site")
+        self.assertEqual(
+            extension.denormalized_site_relations[Vote], "answer__poll__site"
+        )
+
+    def test_register_denormalized_field_not_registered(self):
+        extension = cms_config.PermissionsCMSExtension()
+
+        with self.assertRaises(ImproperlyConfigured):
+            extension.register_denormalized_field(Vote, "site")
+
+    def test_invalid_denormalized_fields_cms_config_parameter(self):
+        extension = cms_config.PermissionsCMSExtension()
+        mocked_cms_config = Mock(
+            spec=[],
+            djangocms_fil_permissions_enabled=True,
+            site_permission_denormalized_fields=["site"],
+            app_config=Mock(label="blah_cms_config"),
+        )
+
+        with self.assertRaises(ImproperlyConfigured):
+            extension.configure_app(mocked_cms_config)
+
+    def test_get_registered_model(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.register_model(Poll, "site")
+        self.assertEqual(extension.get_registered_model(Poll), Poll)
+        self.assertEqual(extension.get_registered_model(PollProxy), Poll)
+        self.assertIsNone(extension.get_registered_model(Answer))
+
+    def test_get_registered_model_subclass(self):
+        base = type("Base", (), {})
+        subclass = type("Subclass", (base,), {})
+        extension = cms_config.PermissionsCMSExtension()
+        extension.register_model(base, "site")
+
+        self.assertEqual(extension.get_registered_model(subclass), base)
+
+    def test_get_registered_model_is_memoized(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.register_model(Poll, "site")
+        extension.get_registered_model(PollProxy)
+        extension.get_registered_model(Answer)
+
+        with patch.object(extension, "site_permission_models", {}):
+            self.assertEqual(extension.get_registered_model(PollProxy), Poll)
+            self.assertIsNone(extension.get_registered_model(Answer))
+
+    def test_get_registered_model_cleared_on_register_model(self):
+        extension = cms_config.PermissionsCMSExtension()
+        self.assertIsNone(extension.get_registered_model(Answer))
+
+        extension.register_model(Answer, "poll__site")
+
+        self.assertEqual(extension.get_registered_model(Answer), Answer)
 
     def test_patch_admin(self):
         extension = cms_config.PermissionsCMSExtension()
@@ -76,6 +159,110 @@ class CMSConfigTestCase(TestCase):
             extension.patch_admin(Poll)
         mock.assert_called_once_with(Poll)
 
+    def test_configure_models_patches_admin_lazily(self):
+        extension = cms_config.PermissionsCMSExtension()
+        site = admin.AdminSite()
+        site.register(Poll)
+        site.register(Group)
+
+        extension.configure_models({Poll: "site"})
+        self.assertNotIsInstance(site._registry[Poll], SitePermissionsModelAdminMixin)
+        site.get_urls()
+
+        self.assertIsInstance(site._registry[Poll], SitePermissionsModelAdminMixin)
+        self.assertNotIsInstance(site._registry[Group], SitePermissionsModelAdminMixin)
+
+    def test_configure_models_patches_admin_sites_created_later(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.configure_models({Poll: "site"})
+        site = admin.AdminSite()
+        site.register(Poll)
+
+        site.get_urls()
+
+        self.assertIsInstance(site._registry[Poll], SitePermissionsModelAdminMixin)
+
+    def test_configure_models_patches_each_admin_site(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.configure_models({Poll: "site"})
+        site1 = admin.AdminSite()
+        site1.register(Poll)
+        site1.get_urls()
+        # Created after another site built its URLs
+        site2 = admin.AdminSite()
+        site2.register(Poll)
+
+        site2.get_urls()
+
+        self.assertIsInstance(site2._registry[Poll], SitePermissionsModelAdminMixin)
+
+    def test_url_bound_modeladmins_are_patched(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.configure_models({Poll: "site"})
+        site = admin.AdminSite()
+        site.register([Poll, PollProxy, Answer, Group])
+
+        patterns = site.urls[0]
+
+        modeladmins = {
+            pattern.callback.model_admin
+            for resolver in patterns
+            if isinstance(resolver, URLResolver)
+            for pattern in resolver.url_patterns
+            if hasattr(pattern.callback, "model_admin")
+        }
+        self.assertEqual(
+            {modeladmin.model for modeladmin in modeladmins},
+            {Poll, PollProxy, Answer, Group},
+        )
+        for modeladmin in modeladmins:
+            self.assertIs(modeladmin, site._registry[modeladmin.model])
+            self.assertEqual(
+                isinstance(modeladmin, SitePermissionsModelAdminMixin),
+                modeladmin.model is not Group,
+            )
+
+    def test_hook_admin_sites_hooks_once(self):
+        cms_config.hook_admin_sites()
+        get_urls = admin.AdminSite.get_urls
+
+        cms_config.hook_admin_sites()
+
+        self.assertIs(admin.AdminSite.get_urls, get_urls)
+
+    def test_patch_admin_sites_shares_generated_classes(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.register_model(Poll, "site")
+        extension.register_model(Answer, "poll__site")
+        modeladmin_class = type("ModelAdmin", (admin.ModelAdmin,), {})
+        site1 = admin.AdminSite()
+        site1.register([Poll, Answer], modeladmin_class)
+        site2 = admin.AdminSite()
+        site2.register(Poll, modeladmin_class)
+
+        with patch.object(cms_config, "all_sites", WeakSet([site1, site2])):
+            extension.patch_admin_sites()
+
+        admin_classes = {
+            site1._registry[Poll].__class__,
+            site1._registry[Answer].__class__,
+            site2._registry[Poll].__class__,
+        }
+        self.assertEqual(len(admin_classes), 1)
+        self.assertTrue(issubclass(admin_classes.pop(), modeladmin_class))
+
+    def test_patch_admin_site(self):
+        extension = cms_config.PermissionsCMSExtension()
+        extension.register_model(Poll, "site")
+        site = admin.AdminSite()
+        site.register(PollProxy)
+        site.register(Answer)
+
+        extension.patch_admin_site(site)
+
+        self.assertIsInstance(site._registry[PollProxy], SitePermissionsModelAdminMixin)
+        self.assertNotIsInstance(site._registry[Answer], SitePermissionsModelAdminMixin)
+
     def test_multiple_apps(self):
         extension = cms_config.PermissionsCMSExtension()
         cms_config1 = Mock(
@@ -97,6 +284,7 @@ class CMSConfigTestCase(TestCase):
             extension.configure_app(cms_config2)
         expected = {Poll: "site", Answer: "poll__site"}
         self.assertDictEqual(extension.site_permission_models, expected)
+        self.assertDictEqual(extension.site_permission_lookups, expected)
 
 
 class IntegrationTestCase(TestCase):
@@ -104,6 +292,19 @@ class IntegrationTestCase(TestCase):
         site_permission_models = apps.get_app_config(
             "djangocms_fil_permissions"
         ).cms_extension.site_permission_models
-        expected_models = {Poll: attrgetter("site"), Answer: attrgetter("poll.site")}
+        expected_models = {
+            Poll: attrgetter("site"),
+            Answer: attrgetter("poll.site"),
+            Comment: attrgetter("answer.poll.site"),
+            Vote: attrgetter("site"),
+        }
 
         self.assertCountEqual(site_permission_models.keys(), expected_models)
+
+    def test_integration_denormalized_fields(self):
+        extension = apps.get_app_config("djangocms_fil_permissions").cms_extension
+
+        self.assertEqual(extension.site_permission_lookups[Vote], "site")
+        self.assertEqual(
+            extension.denormalized_site_relations, {Vote: "answer__poll__site"}
+        )
@@ -0,0 +1,109 @@
+from django.test import RequestFactory, TestCase
+
+from menus.base import NavigationNode
+
+from djangocms_fil_permissions.cms_menus import SitePermissionsModifier
+from djangocms_fil_permissions.helpers import filter_nodes_by_site_access
+from djangocms_fil_permissions.test_utils.factories import (
+    SiteFactory,
+    UserFactory,
+    UserSiteFactory,
+)
+
+
+def build_node(id, parent=None, site=None):
+    attr = {} if site is None else {"site_id": site.pk}
+    node = NavigationNode("node %d" % id, "/%d/" % id, id, attr=attr)
+    if parent is not None:
+        node.parent_id = parent.id
+        node.parent = parent
+        parent.children.append(node)
+    return node
+
+
+class FilterNodesTestCase(TestCase):
+    def setUp(self):
+        self.usersite = UserSiteFactory()
+        self.other_site = SiteFactory()
+        self.root = build_node(1)
+        self.allowed = build_node(2, self.root, self.usersite.site)
+        self.denied = build_node(3, self.root, self.other_site)
+        self.denied_child = build_node(4, self.denied)
+        self.allowed_child = build_node(5, self.allowed)
+        self.nodes = [
+            self.root,
+            self.allowed,
+            self.denied,
+            self.denied_child,
+            self.allowed_child,
+        ]
+
+    def test_filter_nodes_by_site_access(self):
+        nodes = filter_nodes_by_site_access(self.usersite.user, self.nodes)
+
+        self.assertEqual(nodes, [self.root, self.allowed, self.allowed_child])
+        self.assertEqual(self.root.children, [self.allowed])
+        self.assertEqual(self.allowed.children, [self.allowed_child])
+
+    def test_filter_nodes_by_site_access_children_before_parents(self):
+        nodes = filter_nodes_by_site_access(
+            self.usersite.user, list(reversed(self.nodes))
+        )
+
+        self.assertEqual(nodes, [self.allowed_child, self.allowed, self.root])
+
+    def test_filter_nodes_by_site_access_single_query(self):
+        with self.assertNumQueries(1):
+            filter_nodes_by_site_access(self.usersite.user, self.nodes)
+
+    def test_filter_nodes_by_site_access_superuser(self):
+        user = UserFactory(is_superuser=True)
+
+        with self.assertNumQueries(0):
+            nodes = filter_nodes_by_site_access(user, self.nodes)
+
+        self.assertEqual(nodes, self.nodes)
+        self.assertEqual(self.root.children, [self.allowed, self.denied])
+
+
+class SitePermissionsModifierTestCase(TestCase):
+    def setUp(self):
+        self.usersite = UserSiteFactory(user__is_staff=True)
+        self.root = build_node(1)
+        self.denied = build_node(2, self.root, SiteFactory())
+        self.nodes = [self.root, self.denied]
+        self.request = RequestFactory().get("/")
+
+    def modify(self, post_cut=False, breadcrumb=False):
+        modifier = SitePermissionsModifier(renderer=None)
+        return modifier.modify(
+            self.request, self.nodes, None, None, post_cut, breadcrumb
+        )
+
+    def test_modify(self):
+        self.request.user = self.usersite.user
+
+        self.assertEqual(self.modify(), [self.root])
+
+    def test_modify_post_cut(self):
+        self.request.user = self.usersite.user
+
+        self.assertEqual(self.modify(post_cut=True), self.nodes)
+
+    def test_modify_breadcrumb(self):
+        self.request.user = self.usersite.user
+
+        self.assertEqual(self.modify(breadcrumb=True), [self.root])
+
+    def test_modify_not_staff(self):
+        self.request.user = UserFactory()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.modify(), self.nodes)
+
+    def test_modify_no_site_nodes(self):
+        self.request.user = self.usersite.user
+        self.nodes = [self.root, build_node(2, self.root)]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.modify(), self.nodes)
@@ -0,0 +1,204 @@
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from unittest.mock import Mock, patch
+
+from django.core.management import CommandError, call_command
+from django.db.models.signals import post_delete
+from django.test import TestCase
+
+from djangocms_fil_permissions.models import UserSite
+from djangocms_fil_permissions.test_utils.factories import (
+    AnswerFactory,
+    SiteFactory,
+    UserFactory,
+    UserSiteFactory,
+)
+from djangocms_fil_permissions.test_utils.polls.models import Vote
+
+
+class BackfillSiteIdsTestCase(TestCase):
+    def test_backfill_site_ids(self):
+        answers = AnswerFactory.create_batch(3)
+        Vote.objects.bulk_create(Vote(answer=answer) for answer in answers * 2)
+        out = StringIO()
+
+        call_command("backfill_site_ids", "--batch-size=4", stdout=out)
+
+        self.assertIn("polls.vote: 6 objects updated", out.getvalue())
+        for vote in Vote.objects.select_related("answer__poll"):
+            self.assertEqual(vote.site_id, vote.answer.poll.site_id)
+
+    def test_backfill_site_ids_skips_objects_in_sync(self):
+        Vote.objects.create(answer=AnswerFactory())
+        out = StringIO()
+
+        call_command("backfill_site_ids", "polls.Vote", stdout=out)
+
+        self.assertIn("polls.vote: 0 objects updated", out.getvalue())
+
+    def test_backfill_site_ids_unknown_model(self):
+        with self.assertRaises(CommandError):
+            call_command("backfill_site_ids", "polls.Poll", stdout=StringIO())
+
+
+class SyncUserSitesTestCase(TestCase):
+    def setUp(self):
+        self.users = UserFactory.create_batch(2)
+        self.sites = SiteFactory.create_batch(2)
+
+    def sync(self, data, *args):
+        out = StringIO()
+        call_command(
+            "sync_user_sites", *args, stdin=StringIO(data), stdout=out, stderr=out
+        )
+        return out.getvalue()
+
+    def get_memberships(self):
+        return set(UserSite.objects.values_list("user_id", "site_id"))
+
+    def test_sync_user_sites_csv(self):
+        UserSiteFactory(user=self.users[1], site=self.sites[1])
+        data = "user,site,action\n%s,%s,assign\n%s,%s,\n%s,%s,revoke\n" % (
+            self.users[0].username,
+            self.sites[0].domain,
+            self.users[1].username,
+            self.sites[0].domain,
+            self.users[1].username,
+            self.sites[1].domain,
+        )
+
+        out = self.sync(data)
+
+        self.assertEqual(
+            self.get_memberships(),
+            {
+                (self.users[0].pk, self.sites[0].pk),
+                (self.users[1].pk, self.sites[0].pk),
+            },
+        )
+        self.assertIn("Processed 3 records: 2 assigned, 1 revoked, 0 skipped", out)
+
+    def test_sync_user_sites_jsonl(self):
+        data = '{"user": %d, "site": %d}\n{"user": %d, "site": %d}\n' % (
+            self.users[0].pk,
+            self.sites[0].pk,
+            self.users[0].pk,
+            self.sites[0].pk,
+        )
+
+        self.sync(data, "--format=jsonl", "--user-field=pk", "--site-field=pk")
+
+        self.assertEqual(self.get_memberships(), {(self.users[0].pk, self.sites[0].pk)})
+
+    def test_sync_user_sites_queries_per_chunk(self):
+        users = UserFactory.create_batch(10)
+        data = "user,site\n" + "".join(
+            "%s,%s\n" % (user.username, self.sites[0].domain) for user in users
+        )
+
+        # savepoint and its release, site lookup, and per chunk: user lookup,
+        # existing memberships and insert
+        with self.assertNumQueries(9):
+            self.sync(data, "--chunk-size=5")
+
+        self.assertEqual(UserSite.objects.count(), 10)
+
+    def test_sync_user_sites_unknown_user(self):
+        data = "user,site\nunknown,%s\n" % self.sites[0].domain
+
+        out = self.sync(data)
+
+        self.assertFalse(UserSite.objects.exists())
+        self.assertIn("Line 2: unknown user or site: unknown", out)
+        self.assertIn("1 skipped", out)
+
+    def test_sync_user_sites_unknown_action(self):
+        UserSiteFactory(user=self.users[0], site=self.sites[0])
+        data = "user,site,action\n%s,%s,revoke\n%s,%s,grant\n" % (
+            self.users[0].username,
+            self.sites[0].domain,
+            self.users[1].username,
+            self.sites[1].domain,
+        )
+
+        with self.assertRaises(CommandError):
+            self.sync(data, "--chunk-size=1")
+
+        # Changes are rolled back
+        self.assertEqual(self.get_memberships(), {(self.users[0].pk, self.sites[0].pk)})
+
+    def test_sync_user_sites_invalidates_cache(self):
+        data = "user,site\n%s,%s\n" % (self.users[0].username, self.sites[0].domain)
+
+        with patch("djangocms_fil_permissions.cache.invalidate_user") as invalidate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.sync(data)
+            # Not before changes are committed
+            invalidate.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        invalidate.assert_called_once_with(self.users[0].pk)
+
+    def test_sync_user_sites_revoke_queries(self):
+        for user in self.users:
+            UserSiteFactory(user=user, site=self.sites[0])
+        data = "user,site,action\n" + "".join(
+            "%s,%s,revoke\n" % (user.username, self.sites[0].domain)
+            for user in self.users
+        )
+
+        # savepoint and its release, site lookup, user lookup,
+        # existing memberships, and rows to delete and their deletion
+        with self.assertNumQueries(7):
+            self.sync(data)
+
+        self.assertFalse(UserSite.objects.exists())
+
+    def test_sync_user_sites_revoke_sends_signals(self):
+        usersite = UserSiteFactory(user=self.users[0], site=self.sites[0])
+        receiver = Mock()
+        post_delete.connect(receiver, sender=UserSite)
+        self.addCleanup(post_delete.disconnect, receiver, sender=UserSite)
+
+        self.sync(
+            "user,site,action\n%s,%s,revoke\n"
+            % (self.users[0].username, self.sites[0].domain)
+        )
+
+        receiver.assert_called_once()
+        self.assertEqual(receiver.call_args[1]["instance"].user_id, self.users[0].pk)
+        self.assertFalse(UserSite.objects.filter(pk=usersite.pk).exists())
+
+    def test_sync_user_sites_missing_field(self):
+        with self.assertRaisesMessage(CommandError, "Line 3: missing site"):
+            self.sync("user,site\n%s,%s\nfoo\n" % (self.users[0].username, "bar"))
+
+    def test_sync_user_sites_missing_column(self):
+        with self.assertRaisesMessage(CommandError, "Line 2: missing site"):
+            self.sync("user,domain\nfoo,bar\n")
+
+    def test_sync_user_sites_invalid_json(self):
+        data = '{"user": "foo", "site": "bar"}\n\n{"user": \n'
+
+        with self.assertRaisesMessage(CommandError, "Line 3: invalid JSON"):
+            self.sync(data, "--format=jsonl")
+
+    def test_sync_user_sites_json_not_an_object(self):
+        with self.assertRaisesMessage(CommandError, "Line 1: expected an object"):
+            self.sync('["foo", "bar"]\n', "--format=jsonl")
+
+    def test_sync_user_sites_invalid_user_field(self):
+        with self.assertRaisesMessage(CommandError, "--user-field"):
+            self.sync("user,site\nfoo,bar\n", "--user-field=foo")
+
+    def test_sync_user_sites_file(self):
+        with NamedTemporaryFile("w", suffix=".csv") as input_file:
+            input_file.write(
+                "user,site\n%s,%s\n" % (self.users[0].username, self.sites[0].domain)
+            )
+            input_file.flush()
+            out = self.sync("", input_file.name)
+
+        self.assertEqual(self.get_memberships(), {(self.users[0].pk, self.sites[0].pk)})
+        self.assertIn("Processed 1 records", out)
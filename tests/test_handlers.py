@@ -0,0 +1,133 @@
+from django.core.exceptions import PermissionDenied
+from django.db.models.signals import post_save, pre_save
+from django.test import TestCase
+
+from asgiref.sync import sync_to_async
+
+from djangocms_fil_permissions.helpers import (
+    auser_can_access,
+    filter_objects_by_site_access,
+    filter_queryset_by_site_access,
+    get_site_id_for_obj,
+    get_site_id_for_pk,
+    get_site_ids_for_objects,
+    user_can_access,
+)
+from djangocms_fil_permissions.models import UserSite
+from djangocms_fil_permissions.permissions import SitePermissionBackend
+from djangocms_fil_permissions.rules import has_site_access
+from djangocms_fil_permissions.test_utils.factories import (
+    AnswerFactory,
+    PollFactory,
+    SiteFactory,
+    UserFactory,
+    UserSiteFactory,
+    VoteFactory,
+)
+from djangocms_fil_permissions.test_utils.polls.models import PollProxy, Vote
+
+
+class DenormalizedSiteTestCase(TestCase):
+    def test_site_set_on_save(self):
+        vote = VoteFactory()
+
+        self.assertEqual(vote.site_id, vote.answer.poll.site_id)
+
+    def test_site_updated_on_save(self):
+        vote = VoteFactory()
+        vote.answer = AnswerFactory()
+        vote.save()
+
+        vote.refresh_from_db()
+        self.assertEqual(vote.site_id, vote.answer.poll.site_id)
+
+    def test_site_updated_when_poll_site_changes(self):
+        vote = VoteFactory()
+        poll = vote.answer.poll
+        poll.site = SiteFactory()
+
+        with self.assertNumQueries(2):
+            poll.save()
+
+        vote.refresh_from_db()
+        self.assertEqual(vote.site_id, poll.site_id)
+
+    def test_site_updated_when_answer_moves_to_other_poll(self):
+        vote = VoteFactory()
+        answer = vote.answer
+        answer.poll = PollFactory()
+        answer.save()
+
+        vote.refresh_from_db()
+        self.assertEqual(vote.site_id, answer.poll.site_id)
+
+    def test_checks_read_denormalized_site(self):
+        usersite = UserSiteFactory()
+        vote = VoteFactory(answer__poll__site=usersite.site)
+        VoteFactory()
+        vote = Vote.objects.get(pk=vote.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_id_for_obj(vote), usersite.site_id)
+        self.assertNotIn(
+            "JOIN",
+            str(
+                filter_queryset_by_site_access(Vote.objects.all(), usersite.user).query
+            ),
+        )
+        self.assertEqual(
+            list(filter_queryset_by_site_access(Vote.objects.all(), usersite.user)),
+            [vote],
+        )
+
+    def get_unsynced_vote(self, **kwargs):
+        answer = AnswerFactory(**kwargs)
+        Vote.objects.bulk_create([Vote(answer=answer)])
+        return Vote.objects.get(answer=answer)
+
+    def test_missing_denormalized_site_other_site(self):
+        user = UserFactory()
+        vote = self.get_unsynced_vote()
+        self.assertIsNone(vote.site_id)
+
+        self.assertEqual(get_site_id_for_obj(vote), vote.answer.poll.site_id)
+        self.assertFalse(user_can_access(user, vote))
+        self.assertFalse(has_site_access(user, vote))
+        with self.assertRaises(PermissionDenied):
+            SitePermissionBackend().has_perm(user, "polls.change_vote", vote)
+        self.assertEqual(filter_objects_by_site_access(user, [vote]), [])
+
+    def test_missing_denormalized_site_same_site(self):
+        usersite = UserSiteFactory()
+        vote = self.get_unsynced_vote(poll__site=usersite.site)
+
+        self.assertTrue(user_can_access(usersite.user, vote))
+        self.assertEqual(
+            get_site_ids_for_objects([Vote.objects.get(pk=vote.pk)]),
+            [usersite.site_id],
+        )
+        self.assertEqual(get_site_id_for_pk(Vote, vote.pk), usersite.site_id)
+
+    async def test_missing_denormalized_site_async(self):
+        user = await sync_to_async(UserFactory)()
+        vote = await sync_to_async(self.get_unsynced_vote)()
+
+        self.assertFalse(await auser_can_access(user, vote))
+
+    def test_site_updated_when_proxy_poll_site_changes(self):
+        vote = VoteFactory()
+        poll = PollProxy.objects.get(pk=vote.answer.poll_id)
+        poll.site = SiteFactory()
+        poll.save()
+
+        vote.refresh_from_db()
+        self.assertEqual(vote.site_id, poll.site_id)
+
+    def test_receivers_not_connected_to_other_models(self):
+        names = {
+            receiver.__name__
+            for signal in (pre_save, post_save)
+            for receiver in signal._live_receivers(UserSite)
+        }
+
+        self.assertFalse(names & {"sync_site", "sync_related_site"})
@@ -1,25 +1,51 @@
-from unittest.mock import MagicMock, Mock, patch
+import json
+from unittest.mock import Mock, patch
 
 from django.apps import apps
 from django.contrib import admin
-from django.test import TestCase
+from django.contrib.auth.models import Permission
+from django.contrib.sites.models import Site
+from django.db.models import Q
+from django.test import RequestFactory, TestCase
 
-from rules.contrib.admin import ObjectPermissionsModelAdminMixin
+from asgiref.sync import sync_to_async
 
+from djangocms_fil_permissions import cache
+from djangocms_fil_permissions.cms_config import PermissionsCMSExtension
 from djangocms_fil_permissions.helpers import (
+    SitePermissionsModelAdminMixin,
     _replace_admin_for_model,
     admin_factory,
+    afilter_objects_by_site_access,
+    aget_user_site_ids,
+    auser_can_access,
+    auser_has_access_to_site,
+    clear_site_cache,
+    filter_objects_by_site_access,
+    filter_queryset_by_site_access,
     get_extension,
     get_site_for_obj,
+    get_site_id_for_obj,
+    get_site_id_for_pk,
+    get_site_ids_for_objects,
+    get_user_site_ids,
+    memoize_site_access,
     replace_admin_for_model,
+    select_site_relation,
+    site_filter_for_model,
+    user_can_access,
     user_has_access_to_site,
+    user_has_global_site_access,
 )
+from djangocms_fil_permissions.permissions import SitePermissionBackend
 from djangocms_fil_permissions.test_utils.factories import (
+    AnswerFactory,
     PollFactory,
     SiteFactory,
+    UserFactory,
     UserSiteFactory,
 )
-from djangocms_fil_permissions.test_utils.polls.models import Poll
+from djangocms_fil_permissions.test_utils.polls.models import Answer, Poll
 
 
 class GetExtensionTestCase(TestCase):
@@ -57,14 +83,41 @@ class HelpersTestCase(TestCase):
     def test_get_site_for_obj_not_registered_for_site_permissions(self):
         poll = PollFactory()
 
-        registry_mock = MagicMock()
-        registry_mock.__getitem__.side_effect = KeyError
+        extension = Mock(get_registered_model=Mock(return_value=None))
         with patch(
-            "djangocms_fil_permissions.helpers.get_extension",
-            return_value=Mock(site_permission_models=registry_mock),
+            "djangocms_fil_permissions.helpers.get_extension", return_value=extension
         ):
             self.assertIsNone(get_site_for_obj(poll))
-        registry_mock.__getitem__.assert_called_once_with(Poll)
+        extension.get_registered_model.assert_called_once_with(Poll)
+
+    def test_get_site_id_for_obj(self):
+        answer = AnswerFactory()
+        answer = Answer.objects.select_related("poll").get(pk=answer.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_id_for_obj(answer), answer.poll.site_id)
+
+    def test_get_site_id_for_obj_not_registered_for_site_permissions(self):
+        poll = PollFactory()
+        with patch(
+            "djangocms_fil_permissions.helpers.get_extension",
+            return_value=PermissionsCMSExtension(),
+        ):
+            self.assertIsNone(get_site_id_for_obj(poll))
+
+    def test_get_site_id_for_pk(self):
+        answer = AnswerFactory()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_site_id_for_pk(Answer, answer.pk), answer.poll.site_id)
+
+    def test_get_site_id_for_pk_not_registered_for_site_permissions(self):
+        poll = PollFactory()
+        with patch(
+            "djangocms_fil_permissions.helpers.get_extension",
+            return_value=PermissionsCMSExtension(),
+        ), self.assertNumQueries(0):
+            self.assertIsNone(get_site_id_for_pk(Poll, poll.pk))
 
     def test_user_has_access_to_site(self):
         usersite = UserSiteFactory()
@@ -77,6 +130,178 @@ class HelpersTestCase(TestCase):
 
         self.assertFalse(user_has_access_to_site(usersite.user, site2))
 
+    def test_user_has_access_to_site_ids(self):
+        usersite = UserSiteFactory()
+        site2 = SiteFactory()
+
+        with self.assertNumQueries(2) as context:
+            self.assertTrue(user_has_access_to_site(usersite.user_id, usersite.site_id))
+            self.assertFalse(user_has_access_to_site(usersite.user_id, site2.pk))
+        for query in context.captured_queries:
+            self.assertNotIn("django_site", query["sql"])
+
+    def test_user_has_access_to_site_user_id_site_instance(self):
+        usersite = UserSiteFactory()
+
+        self.assertTrue(user_has_access_to_site(usersite.user_id, usersite.site))
+
+    def test_user_has_access_to_site_user_instance_site_id(self):
+        usersite = UserSiteFactory()
+
+        self.assertTrue(user_has_access_to_site(usersite.user, usersite.site_id))
+
+    def test_user_has_access_to_site_ids_shared_cache(self):
+        usersite = UserSiteFactory()
+        with self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "test_user_has_access_to_site_ids_shared_cache",
+                }
+            },
+            DJANGOCMS_FIL_PERMISSIONS_CACHE="default",
+        ):
+            with self.assertNumQueries(1):
+                for _ in range(2):
+                    self.assertTrue(
+                        user_has_access_to_site(usersite.user_id, usersite.site_id)
+                    )
+
+    def test_user_has_access_to_site_is_cached(self):
+        usersite = UserSiteFactory()
+        site2 = SiteFactory()
+        user_has_access_to_site(usersite.user, usersite.site)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(user_has_access_to_site(usersite.user, usersite.site))
+            self.assertFalse(user_has_access_to_site(usersite.user, site2))
+
+    def test_get_user_site_ids(self):
+        usersite1 = UserSiteFactory()
+        usersite2 = UserSiteFactory(user=usersite1.user)
+        UserSiteFactory()
+
+        with self.assertNumQueries(1):
+            site_ids = get_user_site_ids(usersite1.user)
+            get_user_site_ids(usersite1.user)
+        self.assertEqual(site_ids, {usersite1.site_id, usersite2.site_id})
+
+    def test_get_user_site_ids_unsaved_user(self):
+        user = UserFactory.build()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_site_ids(user), frozenset())
+
+    def test_clear_site_cache(self):
+        usersite = UserSiteFactory()
+        site2 = SiteFactory()
+        self.assertFalse(user_has_access_to_site(usersite.user, site2))
+        UserSiteFactory(user=usersite.user, site=site2)
+
+        clear_site_cache(usersite.user)
+
+        self.assertTrue(user_has_access_to_site(usersite.user, site2))
+
+    def test_user_has_global_site_access(self):
+        self.assertTrue(user_has_global_site_access(UserFactory(is_superuser=True)))
+        self.assertFalse(user_has_global_site_access(UserFactory()))
+        self.assertFalse(
+            user_has_global_site_access(UserFactory(is_superuser=True, is_active=False))
+        )
+
+    def test_user_can_access(self):
+        usersite = UserSiteFactory()
+        answer = AnswerFactory(poll__site=usersite.site)
+
+        self.assertTrue(user_can_access(usersite.user, answer))
+        self.assertTrue(user_can_access(usersite.user, answer.poll))
+
+    def test_user_can_access_no_access(self):
+        user = UserFactory()
+        answer = AnswerFactory()
+
+        self.assertFalse(user_can_access(user, answer))
+        self.assertFalse(user_can_access(user, answer.poll))
+
+    def test_user_can_access_not_registered(self):
+        user = UserFactory()
+        self.assertTrue(user_can_access(user, SiteFactory()))
+        self.assertTrue(user_can_access(user, None))
+
+    def test_user_can_access_superuser(self):
+        user = UserFactory(is_superuser=True)
+        poll = PollFactory()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(user_can_access(user, poll))
+
+    def test_clear_site_cache_global_site_access(self):
+        user = UserFactory()
+        self.assertFalse(user_has_global_site_access(user))
+        user.is_superuser = True
+
+        clear_site_cache(user)
+
+        self.assertTrue(user_has_global_site_access(user))
+
+    def test_clear_site_cache_not_cached(self):
+        user = UserFactory()
+        clear_site_cache(user)
+        self.assertFalse(hasattr(user, "_site_cache"))
+
+    def test_memoize_site_access(self):
+        user = UserFactory()
+        poll = PollFactory()
+        check = Mock(return_value=True)
+
+        self.assertTrue(memoize_site_access(user, poll, check))
+        self.assertTrue(memoize_site_access(user, Poll.objects.get(pk=poll.pk), check))
+
+        check.assert_called_once_with(user, poll)
+
+    def test_memoize_site_access_is_bounded(self):
+        user = UserFactory()
+        polls = PollFactory.create_batch(3)
+        check = Mock(return_value=True)
+
+        with self.settings(DJANGOCMS_FIL_PERMISSIONS_ACCESS_MEMO_SIZE=2):
+            for poll in polls + [polls[2], polls[0]]:
+                memoize_site_access(user, poll, check)
+
+        # polls[0] was evicted by polls[2], so it's checked again
+        self.assertEqual(check.call_count, 4)
+        self.assertEqual(
+            list(user._site_access_memo), [(Poll, polls[2].pk), (Poll, polls[0].pk)]
+        )
+
+    def test_memoize_site_access_disabled(self):
+        user = UserFactory()
+        poll = PollFactory()
+        check = Mock(return_value=True)
+
+        with self.settings(DJANGOCMS_FIL_PERMISSIONS_ACCESS_MEMO_SIZE=0):
+            memoize_site_access(user, poll, check)
+            memoize_site_access(user, poll, check)
+
+        self.assertEqual(check.call_count, 2)
+
+    def test_memoize_site_access_unsaved_object(self):
+        user = UserFactory()
+        check = Mock(return_value=True)
+
+        memoize_site_access(user, Poll(), check)
+        memoize_site_access(user, Poll(), check)
+
+        self.assertEqual(check.call_count, 2)
+
+    def test_clear_site_cache_memoized_site_access(self):
+        user = UserFactory()
+        memoize_site_access(user, PollFactory(), Mock(return_value=True))
+
+        clear_site_cache(user)
+
+        self.assertFalse(hasattr(user, "_site_access_memo"))
+
     def test_admin_factory(self):
         base_class = type("A", (), {})
         mixin = type("B", (), {})
@@ -86,6 +311,163 @@ class HelpersTestCase(TestCase):
         self.assertTrue(issubclass(subclass, mixin))
 
 
+class SiteFilterTestCase(TestCase):
+    def test_site_filter_for_model(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        PollFactory()
+
+        self.assertQuerysetEqual(
+            Poll.objects.filter(site_filter_for_model(Poll, usersite.user)),
+            [poll],
+            transform=lambda o: o,
+        )
+
+    def test_site_filter_for_model_related_lookup(self):
+        usersite = UserSiteFactory()
+        answer = AnswerFactory(poll__site=usersite.site)
+        AnswerFactory()
+
+        self.assertQuerysetEqual(
+            Answer.objects.filter(site_filter_for_model(Answer, usersite.user)),
+            [answer],
+            transform=lambda o: o,
+        )
+
+    def test_site_filter_for_model_not_registered(self):
+        user = UserFactory()
+        with patch(
+            "djangocms_fil_permissions.helpers.get_extension",
+            return_value=PermissionsCMSExtension(),
+        ):
+            self.assertEqual(site_filter_for_model(Poll, user), Q())
+
+    def test_filter_queryset_by_site_access(self):
+        usersite = UserSiteFactory()
+        UserSiteFactory(user=usersite.user, site=SiteFactory())
+        polls = PollFactory.create_batch(2, site=usersite.site)
+        PollFactory()
+
+        with self.assertNumQueries(2):
+            queryset = filter_queryset_by_site_access(Poll.objects.all(), usersite.user)
+            self.assertCountEqual(queryset, polls)
+
+    def test_filter_queryset_by_site_access_superuser(self):
+        user = UserFactory(is_superuser=True)
+        polls = PollFactory.create_batch(2)
+
+        with self.assertNumQueries(1):
+            queryset = filter_queryset_by_site_access(Poll.objects.all(), user)
+            self.assertCountEqual(queryset, polls)
+
+    def test_filter_queryset_by_site_access_no_sites(self):
+        user = UserFactory()
+        PollFactory()
+
+        self.assertFalse(filter_queryset_by_site_access(Poll.objects.all(), user))
+
+    def test_select_site_relation(self):
+        answer = AnswerFactory()
+
+        answer = select_site_relation(Answer.objects.all()).get(pk=answer.pk)
+
+        with self.assertNumQueries(0):
+            get_site_id_for_obj(answer)
+
+    def test_select_site_relation_single_hop(self):
+        queryset = Poll.objects.all()
+        self.assertIs(select_site_relation(queryset), queryset)
+
+    def test_select_site_relation_not_registered(self):
+        queryset = Answer.objects.all()
+        with patch(
+            "djangocms_fil_permissions.helpers.get_extension",
+            return_value=PermissionsCMSExtension(),
+        ):
+            self.assertIs(select_site_relation(queryset), queryset)
+
+
+class BulkHelpersTestCase(TestCase):
+    def test_get_site_ids_for_objects(self):
+        polls = PollFactory.create_batch(2)
+        answers = [AnswerFactory(poll=poll) for poll in polls]
+        site = SiteFactory()
+        objects = (
+            list(Answer.objects.filter(pk__in=[a.pk for a in answers]).order_by("pk"))
+            + polls
+            + [site]
+        )
+
+        with self.assertNumQueries(1):
+            site_ids = get_site_ids_for_objects(objects)
+
+        self.assertEqual(
+            site_ids,
+            [polls[0].site_id, polls[1].site_id, polls[0].site_id, polls[1].site_id]
+            + [None],
+        )
+
+    def test_get_site_ids_for_objects_loaded_relations(self):
+        AnswerFactory.create_batch(3)
+        answers = list(Answer.objects.select_related("poll").order_by("pk"))
+
+        with self.assertNumQueries(0):
+            site_ids = get_site_ids_for_objects(answers)
+
+        self.assertEqual(site_ids, [a.poll.site_id for a in answers])
+
+    def test_filter_objects_by_site_access(self):
+        usersite = UserSiteFactory()
+        poll1 = PollFactory(site=usersite.site)
+        poll2 = PollFactory()
+        answer1 = AnswerFactory(poll=poll1)
+        answer2 = AnswerFactory(poll=poll2)
+        site = SiteFactory()
+        objects = [
+            Answer.objects.get(pk=answer2.pk),
+            poll2,
+            site,
+            Answer.objects.get(pk=answer1.pk),
+            poll1,
+        ]
+
+        with self.assertNumQueries(2):
+            allowed = filter_objects_by_site_access(usersite.user, objects)
+
+        self.assertEqual(allowed, [site, objects[3], poll1])
+
+    def test_filter_objects_by_site_access_unsaved_objects(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        other_poll = PollFactory()
+        answer = Answer(poll_id=poll.pk)
+        other_answer = Answer(poll_id=other_poll.pk)
+
+        allowed = filter_objects_by_site_access(usersite.user, [other_answer, answer])
+
+        self.assertEqual(allowed, [answer])
+        self.assertFalse(user_can_access(usersite.user, other_answer))
+
+    def test_filter_objects_by_site_access_deleted_objects(self):
+        usersite = UserSiteFactory()
+        answer = AnswerFactory(poll__site=usersite.site)
+        other_answer = AnswerFactory()
+        objects = list(Answer.objects.order_by("pk"))
+        Answer.objects.all().delete()
+
+        allowed = filter_objects_by_site_access(usersite.user, objects)
+
+        self.assertEqual(allowed, [answer])
+        self.assertNotIn(other_answer, allowed)
+
+    def test_filter_objects_by_site_access_superuser(self):
+        user = UserFactory(is_superuser=True)
+        polls = PollFactory.create_batch(2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(filter_objects_by_site_access(user, polls), polls)
+
+
 class HelpersAdminSiteTestCase(TestCase):
     def setUp(self):
         self.site = admin.AdminSite()
@@ -97,7 +479,7 @@ class HelpersAdminSiteTestCase(TestCase):
         ) as mock:
             replace_admin_for_model(Poll, self.site)
         mock.assert_called_once_with(
-            self.site._registry[Poll], ObjectPermissionsModelAdminMixin, self.site
+            self.site._registry[Poll], SitePermissionsModelAdminMixin, self.site
         )
 
     def test_replace_admin_for_model_not_registered(self):
@@ -125,3 +507,334 @@ class HelpersAdminSiteTestCase(TestCase):
         new_modeladmin = self.site._registry[Poll]
         self.assertNotEqual(modeladmin, new_modeladmin)
         self.assertTrue(isinstance(new_modeladmin, mixin))
+
+
+class SitePermissionsModelAdminMixinTestCase(TestCase):
+    def setUp(self):
+        self.site = admin.AdminSite()
+        self.site.register(Poll)
+        replace_admin_for_model(Poll, self.site)
+        self.modeladmin = self.site._registry[Poll]
+
+    def get_request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def test_get_queryset(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(2, site=usersite.site)
+        PollFactory()
+
+        queryset = self.modeladmin.get_queryset(self.get_request(usersite.user))
+
+        self.assertCountEqual(queryset, polls)
+
+    def test_get_queryset_superuser(self):
+        user = UserFactory(is_superuser=True)
+        polls = PollFactory.create_batch(2)
+
+        queryset = self.modeladmin.get_queryset(self.get_request(user))
+
+        self.assertCountEqual(queryset, polls)
+
+    def test_changelist_count_is_scoped(self):
+        usersite = UserSiteFactory()
+        PollFactory.create_batch(2, site=usersite.site)
+        PollFactory.create_batch(3)
+        request = self.get_request(usersite.user)
+
+        changelist = self.modeladmin.get_changelist_instance(request)
+
+        self.assertEqual(changelist.result_count, 2)
+        self.assertEqual(changelist.full_result_count, 2)
+
+    def test_get_object_site_check_without_queries(self):
+        self.site.register(Answer)
+        replace_admin_for_model(Answer, self.site)
+        modeladmin = self.site._registry[Answer]
+        usersite = UserSiteFactory()
+        answer = AnswerFactory(poll__site=usersite.site)
+        request = self.get_request(usersite.user)
+
+        with self.assertNumQueries(2):
+            obj = modeladmin.get_object(request, str(answer.pk))
+        with self.assertNumQueries(0):
+            self.assertIsNone(
+                SitePermissionBackend().has_perm(
+                    usersite.user, "polls.change_answer", obj
+                )
+            )
+
+    def test_has_change_permission_other_site(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory()
+        request = self.get_request(usersite.user)
+
+        with patch.object(usersite.user, "has_perm") as has_perm:
+            self.assertFalse(self.modeladmin.has_view_permission(request, poll))
+            self.assertFalse(self.modeladmin.has_change_permission(request, poll))
+            self.assertFalse(self.modeladmin.has_delete_permission(request, poll))
+        has_perm.assert_not_called()
+
+    def test_has_change_permission_same_site(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        request = self.get_request(usersite.user)
+
+        with patch.object(usersite.user, "has_perm", return_value=True) as has_perm:
+            self.assertTrue(self.modeladmin.has_view_permission(request, poll))
+            self.assertTrue(self.modeladmin.has_change_permission(request, poll))
+            self.assertTrue(self.modeladmin.has_delete_permission(request, poll))
+        self.assertEqual(has_perm.call_count, 3)
+
+    def test_formfield_for_foreignkey_limits_choices(self):
+        self.site.register(Answer)
+        replace_admin_for_model(Answer, self.site)
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        PollFactory()
+        request = self.get_request(usersite.user)
+
+        formfield = self.site._registry[Answer].formfield_for_foreignkey(
+            Answer._meta.get_field("poll"), request
+        )
+
+        self.assertEqual(list(formfield.queryset), [poll])
+
+    def test_formfield_for_foreignkey_to_site(self):
+        usersite = UserSiteFactory()
+        SiteFactory()
+        request = self.get_request(usersite.user)
+
+        formfield = self.modeladmin.formfield_for_foreignkey(
+            Poll._meta.get_field("site"), request
+        )
+
+        self.assertEqual(list(formfield.queryset), [usersite.site])
+
+    def test_formfield_for_foreignkey_superuser(self):
+        user = UserFactory(is_superuser=True)
+        SiteFactory()
+        request = self.get_request(user)
+
+        formfield = self.modeladmin.formfield_for_foreignkey(
+            Poll._meta.get_field("site"), request
+        )
+
+        self.assertEqual(formfield.queryset.count(), Site.objects.count())
+
+    def test_autocomplete_is_scoped(self):
+        site = admin.AdminSite()
+        site.register(Poll, search_fields=["text"])
+        site.register(Answer, autocomplete_fields=["poll"])
+        replace_admin_for_model(Poll, site)
+        usersite = UserSiteFactory()
+        usersite.user.user_permissions.add(
+            Permission.objects.get(codename="change_poll")
+        )
+        poll = PollFactory(site=usersite.site, text="foo")
+        PollFactory(text="foo")
+        request = RequestFactory().get(
+            "/",
+            {
+                "term": "foo",
+                "app_label": "polls",
+                "model_name": "answer",
+                "field_name": "poll",
+            },
+        )
+        request.user = usersite.user
+
+        response = site.autocomplete_view(request)
+
+        self.assertEqual(
+            json.loads(response.content)["results"],
+            [{"id": str(poll.pk), "text": "foo"}],
+        )
+
+    def post_action(self, user, pks, **data):
+        def record_queryset(modeladmin, request, queryset):
+            self.action_queryset = queryset
+
+        site = admin.AdminSite()
+        site.register(Poll, actions=[record_queryset])
+        replace_admin_for_model(Poll, site)
+        modeladmin = site._registry[Poll]
+        request = RequestFactory().post(
+            "/",
+            dict(data, action="record_queryset", index=0, _selected_action=pks),
+        )
+        request.user = user
+        with patch.object(modeladmin, "message_user") as message_user:
+            modeladmin.response_action(request, modeladmin.get_queryset(request))
+        return message_user
+
+    def test_response_action_skips_other_sites(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(2, site=usersite.site)
+        other_polls = PollFactory.create_batch(2)
+
+        message_user = self.post_action(
+            usersite.user, [poll.pk for poll in polls + other_polls]
+        )
+
+        self.assertCountEqual(self.action_queryset, polls)
+        message_user.assert_called_once()
+        self.assertIn("2 selected objects were skipped", message_user.call_args[0][1])
+
+    def test_response_action_queries(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(20, site=usersite.site)
+        PollFactory.create_batch(20)
+        pks = [poll.pk for poll in Poll.objects.all()]
+
+        # Site IDs of the user, the count of skipped objects
+        # and model permissions of the "delete selected" action
+        with self.assertNumQueries(4):
+            self.post_action(usersite.user, pks)
+
+        self.assertCountEqual(self.action_queryset, polls)
+
+    def test_response_action_nothing_skipped(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+
+        message_user = self.post_action(usersite.user, [poll.pk])
+
+        message_user.assert_not_called()
+
+    def test_response_action_select_across(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(2, site=usersite.site)
+        PollFactory()
+
+        message_user = self.post_action(usersite.user, [polls[0].pk], select_across=1)
+
+        self.assertCountEqual(self.action_queryset, polls)
+        message_user.assert_not_called()
+
+    def test_response_action_superuser(self):
+        user = UserFactory(is_superuser=True)
+        polls = PollFactory.create_batch(2)
+
+        with self.assertNumQueries(0):
+            message_user = self.post_action(user, [poll.pk for poll in polls])
+
+        self.assertCountEqual(self.action_queryset, polls)
+        message_user.assert_not_called()
+
+
+class AsyncHelpersTestCase(TestCase):
+    async def test_aget_user_site_ids(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+
+        self.assertEqual(await aget_user_site_ids(usersite.user), {usersite.site_id})
+        # Shares the cache with get_user_site_ids
+        self.assertEqual(usersite.user._site_cache, {usersite.site_id})
+
+    async def test_aget_user_site_ids_shared_cache(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+
+        def check_cached():
+            with self.assertNumQueries(0):
+                self.assertTrue(
+                    user_has_access_to_site(usersite.user_id, usersite.site_id)
+                )
+            cache.invalidate_user(usersite.user_id)
+
+        with self.settings(DJANGOCMS_FIL_PERMISSIONS_CACHE="default"):
+            await auser_has_access_to_site(usersite.user_id, usersite.site_id)
+            await sync_to_async(check_cached)()
+
+    async def test_auser_has_access_to_site(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+        site = await sync_to_async(SiteFactory)()
+
+        self.assertTrue(await auser_has_access_to_site(usersite.user, usersite.site))
+        self.assertFalse(await auser_has_access_to_site(usersite.user, site))
+        self.assertTrue(
+            await auser_has_access_to_site(usersite.user_id, usersite.site_id)
+        )
+        self.assertFalse(await auser_has_access_to_site(usersite.user_id, site.pk))
+
+    async def test_auser_can_access(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+        answer = await sync_to_async(AnswerFactory)(poll__site=usersite.site)
+        other_answer = await sync_to_async(AnswerFactory)()
+        # Site relations aren't loaded
+        answer = await Answer.objects.aget(pk=answer.pk)
+        other_answer = await Answer.objects.aget(pk=other_answer.pk)
+
+        self.assertTrue(await auser_can_access(usersite.user, answer))
+        self.assertFalse(await auser_can_access(usersite.user, other_answer))
+        self.assertTrue(await auser_can_access(usersite.user, None))
+
+    async def test_auser_can_access_unsaved_objects(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+        poll = await sync_to_async(PollFactory)(site=usersite.site)
+        other_poll = await sync_to_async(PollFactory)()
+        answer = Answer(poll_id=poll.pk)
+        other_answer = Answer(poll_id=other_poll.pk)
+
+        for obj in [answer, other_answer]:
+            self.assertEqual(
+                await auser_can_access(usersite.user, obj),
+                await sync_to_async(user_can_access)(
+                    usersite.user, Answer(poll_id=obj.poll_id)
+                ),
+            )
+        self.assertFalse(await auser_can_access(usersite.user, other_answer))
+        self.assertEqual(
+            await afilter_objects_by_site_access(usersite.user, [other_answer, answer]),
+            [answer],
+        )
+
+    async def test_auser_can_access_deleted_objects(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+        await sync_to_async(AnswerFactory)()
+        other_answer = await Answer.objects.aget()
+        await Answer.objects.all().adelete()
+
+        self.assertFalse(await auser_can_access(usersite.user, other_answer))
+
+    async def test_auser_can_access_superuser(self):
+        user = await sync_to_async(UserFactory)(is_superuser=True)
+        poll = await sync_to_async(PollFactory)()
+
+        self.assertTrue(await auser_can_access(user, poll))
+
+    async def test_auser_can_access_global_access_permission(self):
+        user = await sync_to_async(UserFactory)()
+        poll = await sync_to_async(PollFactory)()
+
+        with self.settings(
+            DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION="sites.change_site"
+        ):
+            self.assertFalse(await auser_can_access(user, poll))
+
+    async def test_afilter_objects_by_site_access(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+        poll = await sync_to_async(PollFactory)(site=usersite.site)
+        answer = await sync_to_async(AnswerFactory)(poll=poll)
+        other_poll = await sync_to_async(PollFactory)()
+        other_answer = await sync_to_async(AnswerFactory)(poll=other_poll)
+        site = await sync_to_async(SiteFactory)()
+        objects = [
+            await Answer.objects.aget(pk=other_answer.pk),
+            poll,
+            site,
+            other_poll,
+            await Answer.objects.aget(pk=answer.pk),
+        ]
+
+        filtered = await afilter_objects_by_site_access(usersite.user, objects)
+
+        self.assertEqual(filtered, [poll, site, answer])
+
+    async def test_ahas_site_access(self):
+        usersite = await sync_to_async(UserSiteFactory)()
+        poll = await sync_to_async(PollFactory)(site=usersite.site)
+        backend = SitePermissionBackend()
+
+        self.assertTrue(await backend.ahas_site_access(usersite.user, poll))
@@ -0,0 +1,105 @@
+from unittest.mock import Mock, patch
+
+from django.test import TestCase, override_settings
+
+from djangocms_fil_permissions import instrumentation
+from djangocms_fil_permissions.helpers import get_user_site_ids, user_has_access_to_site
+from djangocms_fil_permissions.instrumentation import (
+    MemoryCollector,
+    instrument,
+    load_collectors,
+    register_collector,
+    unregister_collector,
+)
+from djangocms_fil_permissions.permissions import SitePermissionBackend
+from djangocms_fil_permissions.rules import has_site_access
+from djangocms_fil_permissions.test_utils.factories import (
+    AnswerFactory,
+    PollFactory,
+    UserSiteFactory,
+)
+from djangocms_fil_permissions.test_utils.polls.models import Answer, Poll
+
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        self.collector = MemoryCollector()
+        register_collector(self.collector)
+
+    def tearDown(self):
+        unregister_collector(self.collector)
+
+    def test_has_perm(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        answer = AnswerFactory(poll=poll)
+        backend = SitePermissionBackend()
+
+        backend.has_perm(usersite.user, "polls.change_poll", poll)
+        backend.has_perm(usersite.user, "polls.change_answer", obj=answer)
+
+        self.assertEqual(len(self.collector.timings["has_perm", Poll]), 1)
+        self.assertEqual(len(self.collector.timings["has_perm", Answer]), 1)
+        self.assertEqual(len(self.collector.timings["has_site_access", Poll]), 1)
+        self.assertEqual(len(self.collector.timings["get_site_id_for_obj", Poll]), 1)
+        self.assertEqual(self.collector.counters["db_hit", None], 1)
+        self.assertEqual(self.collector.counters["memory_hit", None], 1)
+
+    def test_user_has_access_to_site(self):
+        usersite = UserSiteFactory()
+
+        user_has_access_to_site(usersite.user_id, usersite.site_id)
+
+        self.assertEqual(
+            len(self.collector.timings["user_has_access_to_site", None]), 1
+        )
+        self.assertEqual(self.collector.counters["db_hit", None], 1)
+
+    def test_shared_cache(self):
+        usersite = UserSiteFactory()
+        with self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "test_instrumentation",
+                }
+            },
+            DJANGOCMS_FIL_PERMISSIONS_CACHE="default",
+        ):
+            get_user_site_ids(usersite.user)
+            get_user_site_ids(usersite.user.__class__(pk=usersite.user_id))
+
+        self.assertEqual(self.collector.counters["cache_miss", None], 1)
+        self.assertEqual(self.collector.counters["cache_hit", None], 1)
+        self.assertEqual(self.collector.counters["db_hit", None], 1)
+
+    def test_exception_is_timed(self):
+        func = instrument("failing")(Mock(side_effect=ValueError))
+
+        with self.assertRaises(ValueError):
+            func()
+        self.assertEqual(len(self.collector.timings["failing", None]), 1)
+
+    def test_predicate_signature_is_preserved(self):
+        self.assertEqual(has_site_access.num_args, 2)
+
+
+class DisabledInstrumentationTestCase(TestCase):
+    def test_no_collectors(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+
+        with patch.object(instrumentation, "perf_counter") as perf_counter:
+            SitePermissionBackend().has_perm(usersite.user, "polls.change_poll", poll)
+        perf_counter.assert_not_called()
+
+    @override_settings(
+        DJANGOCMS_FIL_PERMISSIONS_COLLECTORS=[
+            "djangocms_fil_permissions.instrumentation.MemoryCollector"
+        ]
+    )
+    def test_load_collectors(self):
+        with patch.object(instrumentation, "collectors", []) as collectors:
+            load_collectors()
+            self.assertEqual(len(collectors), 1)
+            self.assertIsInstance(collectors[0], MemoryCollector)
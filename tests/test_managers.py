@@ -0,0 +1,95 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.test import TestCase
+
+from djangocms_fil_permissions.managers import (
+    SiteScopedQuerySet,
+    SiteScopedQuerySetMixin,
+    site_scoped_manager,
+)
+from djangocms_fil_permissions.models import UserSite
+from djangocms_fil_permissions.test_utils.factories import (
+    AnswerFactory,
+    PollFactory,
+    UserFactory,
+    UserSiteFactory,
+)
+from djangocms_fil_permissions.test_utils.polls.models import Answer, Poll, PollProxy
+
+
+class SiteScopedQuerySetTestCase(TestCase):
+    def test_for_user(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(2, site=usersite.site)
+        PollFactory()
+
+        with self.assertNumQueries(2):
+            self.assertCountEqual(Poll.objects.for_user(usersite.user), polls)
+
+    def test_for_user_chained(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site, text="foo")
+        PollFactory(site=usersite.site, text="bar")
+        PollFactory(text="foo")
+
+        queryset = Poll.objects.filter(text="foo").for_user(usersite.user)
+
+        self.assertEqual(list(queryset), [poll])
+
+    def test_for_user_proxy_model(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        PollFactory()
+
+        self.assertEqual(
+            list(PollProxy.objects.for_user(usersite.user)),
+            [PollProxy.objects.get(pk=poll.pk)],
+        )
+
+    def test_for_user_relation(self):
+        usersite = UserSiteFactory()
+        answer = AnswerFactory(poll__site=usersite.site)
+        AnswerFactory()
+
+        queryset = SiteScopedQuerySet(model=Answer).for_user(usersite.user)
+
+        self.assertEqual(list(queryset), [answer])
+
+    def test_for_user_superuser(self):
+        user = UserFactory(is_superuser=True)
+        polls = PollFactory.create_batch(2)
+
+        self.assertCountEqual(Poll.objects.for_user(user), polls)
+
+    def test_for_user_not_registered(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SiteScopedQuerySet(model=UserSite).for_user(UserFactory())
+
+
+class SiteScopedManagerTestCase(TestCase):
+    def test_site_scoped_manager(self):
+        class CustomQuerySet(models.QuerySet):
+            def foo(self):
+                return self.filter(text="foo")
+
+        manager_class = site_scoped_manager(CustomQuerySet.as_manager().__class__)
+        manager = manager_class()
+        manager.model = Poll
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site, text="foo")
+        PollFactory(text="foo")
+
+        self.assertEqual(list(manager.foo().for_user(usersite.user)), [poll])
+        self.assertTrue(
+            issubclass(manager_class._queryset_class, SiteScopedQuerySetMixin)
+        )
+
+    def test_site_scoped_manager_is_cached(self):
+        self.assertIs(
+            site_scoped_manager(models.Manager), site_scoped_manager(models.Manager)
+        )
+
+    def test_site_scoped_manager_already_scoped(self):
+        manager_class = site_scoped_manager(Poll.objects.__class__)
+
+        self.assertIs(manager_class._queryset_class, SiteScopedQuerySet)
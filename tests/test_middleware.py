@@ -0,0 +1,72 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
+
+from djangocms_fil_permissions.middleware import SiteAccess, SiteAccessMiddleware
+from djangocms_fil_permissions.permissions import SitePermissionBackend
+from djangocms_fil_permissions.test_utils.factories import (
+    PollFactory,
+    SiteFactory,
+    UserFactory,
+    UserSiteFactory,
+)
+
+
+class SiteAccessTestCase(TestCase):
+    def test_contains(self):
+        site1, site2 = SiteFactory.create_batch(2)
+        site_access = SiteAccess([site1.pk])
+
+        self.assertIn(site1, site_access)
+        self.assertIn(site1.pk, site_access)
+        self.assertNotIn(site2, site_access)
+        self.assertNotIn(site2.pk, site_access)
+
+    def test_contains_global(self):
+        site = SiteFactory()
+        self.assertIn(site, SiteAccess(frozenset(), is_global=True))
+
+    def test_immutable(self):
+        site_access = SiteAccess([1])
+        with self.assertRaises(AttributeError):
+            site_access.site_ids = frozenset([2])
+
+
+class SiteAccessMiddlewareTestCase(TestCase):
+    def get_request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def process_request(self, request):
+        SiteAccessMiddleware(lambda request: None).process_request(request)
+
+    def test_process_request(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(3, site=usersite.site)
+        request = self.get_request(usersite.user)
+
+        with self.assertNumQueries(1):
+            self.process_request(request)
+            for poll in polls:
+                SitePermissionBackend().has_perm(
+                    request.user, "polls.change_poll", poll
+                )
+
+        self.assertEqual(request.user.site_access.site_ids, {usersite.site_id})
+        self.assertFalse(request.user.site_access.is_global)
+
+    def test_process_request_superuser(self):
+        request = self.get_request(UserFactory(is_superuser=True))
+
+        with self.assertNumQueries(0):
+            self.process_request(request)
+
+        self.assertTrue(request.user.site_access.is_global)
+
+    def test_process_request_anonymous_user(self):
+        request = self.get_request(AnonymousUser())
+
+        with self.assertNumQueries(0):
+            self.process_request(request)
+
+        self.assertFalse(hasattr(request.user, "site_access"))
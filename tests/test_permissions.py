@@ -1,15 +1,33 @@
-from unittest.mock import MagicMock, Mock, patch
+from unittest.mock import patch
 
+from django.contrib import admin
+from django.contrib.auth.models import Permission
 from django.core.exceptions import PermissionDenied
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
-from djangocms_fil_permissions.permissions import SitePermissionBackend
+from rules import always_allow
+
+from djangocms_fil_permissions.cms_config import PermissionsCMSExtension
+from djangocms_fil_permissions.helpers import (
+    afilter_objects_by_site_access,
+    auser_can_access,
+    filter_objects_by_site_access,
+    replace_admin_for_model,
+    user_can_access,
+)
+from djangocms_fil_permissions.permissions import (
+    SitePermissionBackend,
+    site_permissions,
+)
+from djangocms_fil_permissions.rules import has_site_access
 from djangocms_fil_permissions.test_utils.factories import (
+    AnswerFactory,
     PollFactory,
     SiteFactory,
     UserFactory,
     UserSiteFactory,
 )
+from djangocms_fil_permissions.test_utils.polls.models import Answer, Poll
 
 
 class SmokePermissionsTestCase(TestCase):
@@ -41,11 +59,9 @@ class PermissionsTestCase(TestCase):
         site2 = SiteFactory()
         poll = PollFactory(site=site2)
 
-        registry_mock = MagicMock()
-        registry_mock.__getitem__.side_effect = KeyError
         with patch(
             "djangocms_fil_permissions.helpers.get_extension",
-            return_value=Mock(site_permission_models=registry_mock),
+            return_value=PermissionsCMSExtension(),
         ):
             self.assertIsNone(
                 SitePermissionBackend().has_perm(
@@ -53,6 +69,141 @@ class PermissionsTestCase(TestCase):
                 )
             )
 
+    def test_has_perm_site_ids_are_cached(self):
+        usersite = UserSiteFactory()
+        polls = PollFactory.create_batch(3, site=usersite.site)
+        backend = SitePermissionBackend()
+
+        with self.assertNumQueries(1):
+            for poll in polls:
+                backend.has_perm(usersite.user, "polls.change_poll", poll)
+
+    def test_clear_site_cache(self):
+        usersite = UserSiteFactory()
+        backend = SitePermissionBackend()
+        self.assertEqual(backend.get_site_ids(usersite.user), {usersite.site_id})
+        usersite2 = UserSiteFactory(user=usersite.user)
+
+        backend.clear_site_cache(usersite.user)
+
+        self.assertEqual(
+            backend.get_site_ids(usersite.user), {usersite.site_id, usersite2.site_id}
+        )
+
+    def test_has_perm_superuser(self):
+        user = UserFactory(is_superuser=True)
+        poll = PollFactory()
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(
+                SitePermissionBackend().has_perm(user, "polls.change_poll", poll)
+            )
+
+    def test_has_perm_global_access_permission(self):
+        user = UserFactory()
+        user.user_permissions.add(
+            Permission.objects.get(
+                codename="change_site", content_type__app_label="sites"
+            )
+        )
+        polls = PollFactory.create_batch(2)
+        backend = SitePermissionBackend()
+
+        with self.settings(
+            DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION="sites.change_site"
+        ):
+            backend.has_perm(user, "polls.change_poll", polls[0])
+            with self.assertNumQueries(0):
+                self.assertIsNone(backend.has_perm(user, "polls.change_poll", polls[1]))
+
+    def test_has_perm_global_access_permission_not_granted(self):
+        user = UserFactory()
+        poll = PollFactory()
+
+        with self.settings(
+            DJANGOCMS_FIL_PERMISSIONS_GLOBAL_ACCESS_PERMISSION="sites.change_site"
+        ), self.assertRaises(PermissionDenied):
+            SitePermissionBackend().has_perm(user, "polls.change_poll", poll)
+
+    def test_has_site_access(self):
+        usersite = UserSiteFactory()
+        poll1 = PollFactory(site=usersite.site)
+        poll2 = PollFactory()
+        backend = SitePermissionBackend()
+
+        self.assertTrue(backend.has_site_access(usersite.user, poll1))
+        self.assertFalse(backend.has_site_access(usersite.user, poll2))
+
     def test_has_perm_no_obj_passed(self):
         user = UserFactory()
         self.assertIsNone(SitePermissionBackend().has_perm(user, "polls.change_poll"))
+
+    def test_has_perm_memoized(self):
+        usersite = UserSiteFactory()
+        answer = AnswerFactory(poll__site=usersite.site)
+        backend = SitePermissionBackend()
+        backend.has_perm(usersite.user, "polls.change_answer", answer)
+
+        # Site relation of a refetched object isn't loaded,
+        # but the result is reused
+        answer = Answer.objects.get(pk=answer.pk)
+        with self.assertNumQueries(0):
+            backend.has_perm(usersite.user, "polls.change_answer", answer)
+
+    def test_has_perm_memo_cleared(self):
+        user = UserFactory()
+        poll = PollFactory()
+        backend = SitePermissionBackend()
+        with self.assertRaises(PermissionDenied):
+            backend.has_perm(user, "polls.change_poll", poll)
+        UserSiteFactory(user=user, site=poll.site)
+
+        backend.clear_site_cache(user)
+
+        self.assertIsNone(backend.has_perm(user, "polls.change_poll", poll))
+
+    def test_has_perm_replaced_rule(self):
+        user = UserFactory()
+        poll = PollFactory()
+        site_permissions.set_rule("site_perm", always_allow)
+        self.addCleanup(site_permissions.set_rule, "site_perm", has_site_access)
+
+        self.assertIsNone(
+            SitePermissionBackend().has_perm(user, "polls.change_poll", poll)
+        )
+
+
+class ReplacedSitePermTestCase(TestCase):
+    def setUp(self):
+        site_permissions.set_rule("site_perm", always_allow)
+        self.addCleanup(site_permissions.set_rule, "site_perm", has_site_access)
+        self.user = UserFactory()
+        self.poll = PollFactory()
+
+    def test_user_can_access(self):
+        self.assertTrue(user_can_access(self.user, self.poll))
+
+    def test_filter_objects_by_site_access(self):
+        self.assertEqual(
+            filter_objects_by_site_access(self.user, [self.poll]), [self.poll]
+        )
+
+    def test_admin_has_change_permission(self):
+        site = admin.AdminSite()
+        site.register(Poll)
+        replace_admin_for_model(Poll, site)
+        request = RequestFactory().get("/")
+        request.user = self.user
+
+        with patch.object(self.user, "has_perm", return_value=True):
+            self.assertTrue(
+                site._registry[Poll].has_change_permission(request, self.poll)
+            )
+
+    async def test_auser_can_access(self):
+        self.assertTrue(await auser_can_access(self.user, self.poll))
+
+    async def test_afilter_objects_by_site_access(self):
+        self.assertEqual(
+            await afilter_objects_by_site_access(self.user, [self.poll]), [self.poll]
+        )
@@ -9,6 +9,7 @@ from djangocms_fil_permissions.test_utils.factories import (
     UserFactory,
     UserSiteFactory,
 )
+from djangocms_fil_permissions.test_utils.polls.models import Poll, PollProxy
 
 
 class RulesTestCase(TestCase):
@@ -25,16 +26,32 @@ class RulesTestCase(TestCase):
 
         self.assertFalse(has_site_access(user, poll))
 
+    def test_has_site_access_proxy_model(self):
+        user = UserFactory()
+        poll = PollFactory()
+        proxy = PollProxy.objects.get(pk=poll.pk)
+
+        self.assertFalse(has_site_access(user, proxy))
+
     def test_has_site_access_no_site_relation(self):
         user = UserFactory()
         site = SiteFactory()
         poll = PollFactory(site=site)
 
         with patch(
-            "djangocms_fil_permissions.rules.get_site_for_obj", return_value=None
-        ) as get_site_for_obj, patch(
-            "djangocms_fil_permissions.rules.user_has_access_to_site"
-        ) as user_has_access_to_site:
+            "djangocms_fil_permissions.rules.get_site_id_for_obj", return_value=None
+        ) as get_site_id_for_obj, patch(
+            "djangocms_fil_permissions.rules.get_user_site_ids"
+        ) as get_user_site_ids:
             self.assertTrue(has_site_access(user, poll))
-        get_site_for_obj.assert_called_once_with(poll)
-        user_has_access_to_site.assert_not_called()
+        get_site_id_for_obj.assert_called_once_with(poll)
+        get_user_site_ids.assert_not_called()
+
+    def test_has_site_access_doesnt_fetch_site(self):
+        usersite = UserSiteFactory()
+        poll = PollFactory(site=usersite.site)
+        poll = Poll.objects.get(pk=poll.pk)
+        has_site_access(usersite.user, poll)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(has_site_access(usersite.user, poll))